@@ -0,0 +1,204 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# ----------------- MÉTRICAS DEL LIBRO -----------------
+# Convención de lados: los que venden USDT (data_ventas) forman el lado ask
+# (mejor = precio más bajo); los que compran USDT (data_compras) el lado bid
+# (mejor = precio más alto).
+#
+# Todo se calcula sobre columnas NumPy (precio, monto, merchant) en lugar de
+# recorrer diccionarios: el único bucle de Python es el que pasa los registros
+# a columnas, una vez por lado y por snapshot.
+
+# Montos (USDT) para los que se calcula el VWAP de llenado en el resumen
+VWAP_AMOUNTS = tuple(float(a) for a in os.environ.get('ANALYTICS_VWAP_AMOUNTS', '100,1000,10000').split(',') if a)
+TOP_MERCHANTS = 5
+CACHE_SIZE = 64
+
+
+class BookSide:
+    """Un lado del libro en columnas: `prices`, `amounts` (float64) y `merchants` (códigos enteros)."""
+
+    __slots__ = ("prices", "amounts", "merchants", "merchant_names", "descending")
+
+    def __init__(self, data, descending=False):
+        self.descending = descending
+        n = len(data)
+        prices = np.fromiter((item.get("precio_bob") or 0.0 for item in data), np.float64, n)
+        amounts = np.fromiter((item.get("monto_usdt") or 0.0 for item in data), np.float64, n)
+        codes = {}
+        merchants = np.fromiter((codes.setdefault(item.get("merchant") or "", len(codes)) for item in data),
+                                np.intp, n)
+        # Igual que antes: se descartan los registros sin precio o sin monto
+        valid = (prices != 0) & (amounts != 0)
+        self.prices, self.amounts, self.merchants = prices[valid], amounts[valid], merchants[valid]
+        self.merchant_names = list(codes)
+
+    def __len__(self):
+        return len(self.prices)
+
+    @property
+    def depth(self):
+        return float(self.amounts.sum())
+
+    @property
+    def best(self):
+        if not len(self):
+            return None
+        return float(self.prices.max() if self.descending else self.prices.min())
+
+
+def bucket_prices(prices, bucket, descending=False):
+    """
+    Agrupa precios en intervalos de `bucket` (p. ej. 0.05 BOB). Los asks se
+    redondean hacia arriba y los bids hacia abajo, así un nivel agrupado nunca
+    promete un precio mejor que el de sus anuncios.
+    """
+    if not bucket:
+        return prices
+    steps = prices / bucket
+    # El épsilon evita que 6.95 / 0.05 = 138.99999... caiga en el intervalo de al lado
+    steps = np.floor(steps + 1e-9) if descending else np.ceil(steps - 1e-9)
+    return np.round(steps * bucket, 8)
+
+
+def levels_arrays(side, bucket=None):
+    """(precios, volumen, anuncios) por nivel, en orden ascendente de precio."""
+    prices = bucket_prices(side.prices, bucket, side.descending)
+    levels, inverse = np.unique(prices, return_inverse=True)
+    volume = np.bincount(inverse, weights=side.amounts, minlength=len(levels))
+    count = np.bincount(inverse, minlength=len(levels))
+    return levels, volume, count
+
+
+def price_levels(data, bucket=None, descending=False):
+    """Agrupa registros por precio: [[precio, volumen, anuncios], ...] de menor a mayor precio."""
+    side = data if isinstance(data, BookSide) else BookSide(data, descending)
+    levels, volume, count = levels_arrays(side, bucket)
+    return [list(level) for level in zip(levels.tolist(), np.round(volume, 8).tolist(), count.tolist())]
+
+
+def _best_first(side):
+    order = np.argsort(-side.prices if side.descending else side.prices, kind="stable")
+    return side.prices[order], side.amounts[order]
+
+
+def depth_curve(side, bucket=None):
+    """Profundidad acumulada desde el mejor precio: [[precio, volumen acumulado], ...]."""
+    levels, volume, _ = levels_arrays(side, bucket)
+    if side.descending:
+        levels, volume = levels[::-1], volume[::-1]
+    return [list(point) for point in zip(levels.tolist(), np.round(np.cumsum(volume), 8).tolist())]
+
+
+def vwap(side, amounts):
+    """
+    Precio medio ponderado para llenar cada monto de `amounts` (USDT) recorriendo
+    el lado desde el mejor precio. None si el lado no tiene profundidad suficiente.
+    """
+    prices, volume = _best_first(side)
+    cumulative = np.cumsum(volume)
+    notional = np.cumsum(prices * volume)
+    targets = np.asarray(amounts, dtype=np.float64)
+    # Índice del anuncio que completa cada monto
+    idx = np.searchsorted(cumulative, targets - 1e-9)
+    result = []
+    for target, i in zip(targets.tolist(), idx.tolist()):
+        if i >= len(prices) or target <= 0:
+            result.append(None)
+            continue
+        filled_before = cumulative[i - 1] if i else 0.0
+        cost_before = notional[i - 1] if i else 0.0
+        cost = cost_before + (target - filled_before) * prices[i]
+        result.append(round(float(cost / target), 8))
+    return result
+
+
+def merchant_concentration(side, top=TOP_MERCHANTS):
+    """
+    Concentración del volumen por merchant: los `top` con más volumen (con su
+    participación) e índice Herfindahl-Hirschman (0 = disperso, 1 = un solo merchant).
+    """
+    total = side.depth
+    if not total:
+        return {"merchants": 0, "hhi": None, "top": []}
+    volume = np.bincount(side.merchants, weights=side.amounts, minlength=len(side.merchant_names))
+    shares = volume / total
+    order = np.argsort(-volume, kind="stable")[:top]
+    return {
+        "merchants": int(np.count_nonzero(volume)),
+        "hhi": round(float(np.square(shares).sum()), 6),
+        "top": [{"merchant": str(side.merchant_names[i]), "volume": round(float(volume[i]), 8),
+                 "share": round(float(shares[i]), 6)} for i in order.tolist()],
+    }
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cached(key, build):
+    """LRU compartido por versión de snapshot (las versiones nunca se reutilizan)."""
+    with _cache_lock:
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+            return value
+    value = build()
+    with _cache_lock:
+        _cache[key] = value
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return value
+
+
+def book_sides(snapshot):
+    """
+    (asks, bids) de un snapshot como columnas. Pasar los registros a columnas es
+    lo único caro (un recorrido en Python); se hace una vez por versión.
+    """
+    return _cached(("sides", snapshot.market, snapshot.version),
+                   lambda: (BookSide(snapshot.data_ventas), BookSide(snapshot.data_compras, descending=True)))
+
+
+def summarize(snapshot, bucket=None):
+    """
+    Mejores precios, spread, profundidad, VWAP de llenado, concentración y niveles
+    de ambos lados de un snapshot. Se calcula una vez por versión (y agrupamiento):
+    la página, la API, el historial y el SSE comparten el resultado, que no deben modificar.
+    """
+    return _cached(("summary", snapshot.market, snapshot.version, bucket), lambda: _summarize(snapshot, bucket))
+
+
+def _summarize(snapshot, bucket):
+    asks, bids = book_sides(snapshot)
+    best_ask, best_bid = asks.best, bids.best
+    both = best_ask is not None and best_bid is not None
+    return {
+        "best_bid": best_bid,
+        "best_ask": best_ask,
+        "spread": round(best_ask - best_bid, 8) if both else None,
+        "mid": round((best_ask + best_bid) / 2, 8) if both else None,
+        "depth_bid": round(bids.depth, 8),
+        "depth_ask": round(asks.depth, 8),
+        "adverts_bid": len(bids),
+        "adverts_ask": len(asks),
+        "vwap_bid": dict(zip((f"{a:g}" for a in VWAP_AMOUNTS), vwap(bids, VWAP_AMOUNTS))),
+        "vwap_ask": dict(zip((f"{a:g}" for a in VWAP_AMOUNTS), vwap(asks, VWAP_AMOUNTS))),
+        "concentration": {"bids": merchant_concentration(bids), "asks": merchant_concentration(asks)},
+        "levels": {"bids": price_levels(bids, bucket)[::-1], "asks": price_levels(asks, bucket)},
+    }
+
+
+def book_stats(summary):
+    """Spread, precio medio y VWAP del primer monto de VWAP_AMOUNTS: la línea de resumen de la página."""
+    amount = next(iter(summary["vwap_ask"]), None)
+    return {
+        "spread": summary["spread"],
+        "mid": summary["mid"],
+        "vwap_amount": amount,
+        "vwap_ask": summary["vwap_ask"].get(amount),
+        "vwap_bid": summary["vwap_bid"].get(amount),
+    }
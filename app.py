@@ -1,17 +1,23 @@
-import asyncio
-from playwright.async_api import async_playwright
-import json
-import re
+import math
 import sys
-from collections import defaultdict
-from flask import Flask, render_template_string
+import threading
+import time
+# Referencia para los tiempos de arranque (ver BootTimer): antes de los imports pesados
+BOOT_STARTED = time.monotonic()
+from flask import Flask, Response, abort, jsonify, render_template, request
 import os
-import nest_asyncio
-
-# Aplica nest_asyncio para permitir la ejecución de asyncio.run anidado,
-# lo cual es común cuando se ejecuta código asíncrono dentro de un entorno síncrono
-# como el servidor de desarrollo de Flask.
-nest_asyncio.apply()
+import zlib
+import numpy as np
+from analytics import BookSide, book_sides, book_stats, depth_curve, levels_arrays, summarize
+from browser_pool import HEALTH_CHECK_INTERVAL
+from history import HISTORY_DB, HistoryStore
+from http_cache import cached_json, cached_response, encoded_cache, snapshot_etag
+from markets import DEFAULT_MARKET, EXCHANGES, MARKETS, fetch_market, get_market
+from metrics import REGISTRY
+from scheduler import MarketScheduler
+from scraper import default_browser_manager
+from snapshot import SnapshotFile, SnapshotStore
+from streaming import Broadcaster, levels_payload
 
 # ----------------- CONFIGURACIÓN FLASK Y BÁSICA -----------------
 app = Flask(__name__)
@@ -21,262 +27,426 @@ try:
 except AttributeError:
     pass
 
-# --- URLs Definidas ---
-# Cambiamos los nombres para mayor claridad en el contexto P2P:
-# VENTA de USDT -> Compramos BOB (Side 1 en Bybit, Offer Side en Bitget)
-# COMPRA de USDT -> Vendemos BOB (Side 0 en Bybit, Demand Side en Bitget)
-URL_VENTAS = "https://www.bitget.com/p2p-trade/sell?paymethodIds=-1&fiatName=BOB" # La gente VENDE USDT, tu COMPRAS BOB
-URL_COMPRAS = "https://www.bitget.com/p2p-trade?paymethodIds=-1&fiatName=BOB" # La gente COMPRA USDT, tu VENDES BOB
-
-# --- Función Auxiliar ---
-def clean_number(text):
-    """Limpia texto y devuelve float."""
-    if not text: return None
-    text = text.upper().replace("BOB", "").replace("USDT", "").replace("≈", "").replace(",", "").strip()
-    match = re.findall(r"[0-9\.]+", text)
-    if not match: return None
-    try: return float(match[0])
-    except: return None
-
-# --- Función de Scraping Reutilizable ---
-async def scrape_bitget_p2p(url: str, operation_type: str):
-    """
-    Función de scraping adaptada para devolver resultados silenciosamente.
-    Se eliminan los print() excepto los de errores importantes.
-    """
-    all_results = []
-    MAX_PAGES = 2 # Limitado a 2 páginas para el ejemplo
-
-    async with async_playwright() as pw:
-        # Configuración Anti-Detección
-        browser = await pw.chromium.launch(
-            headless=True,  
-            args=["--disable-blink-features=AutomationControlled"]
-        )
-
-        context = await browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        await context.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        
-        page = await context.new_page()
-
-        try:
-            # print(f"Navegando a {url}...")
-            await page.goto(url, timeout=90000) 
-
-            # Lógica de Cierre de Popups
-            await page.wait_for_timeout(4000) 
-            await page.keyboard.press("Escape")
-            await page.wait_for_timeout(500)
-            await page.mouse.click(50, 50)
-            await page.wait_for_timeout(500)
-            
-            try: await page.locator('.bit-dialog__close').click(timeout=3000)
-            except Exception: pass
-            
-            try: await page.get_by_test_id('MicroCookieAcceptButton').click(timeout=3000)
-            except Exception: pass
-            
-            await page.wait_for_selector(".hall-list-item", state="visible", timeout=60000)
-            
-            # Bucle de Paginación y Scraping
-            for page_num in range(1, MAX_PAGES + 1):
-                page_str = str(page_num)
-
-                # ⚠️ 1. NAVEGACIÓN (Solo hacer clic si no estamos en la página 1)
-                if page_num > 1:
-                    target_page_locator = page.get_by_text(page_str, exact=True)
-
-                    if await target_page_locator.count() == 0:
-                        break # No se encontró el número de página. Finalizando.
-
-                    await target_page_locator.click(force=True)
-                    
-                    # Esperamos a que la página se active
-                    try:
-                        await page.wait_for_selector(
-                            f'.bit-pager li.number.active:has-text("{page_str}")',
-                            timeout=10000 
-                        )
-                        await page.wait_for_timeout(1500) 
-                    except Exception:
-                        continue # La página no se activó a tiempo. Saltando la extracción.
-
-                # 📝 2. EXTRACCIÓN DE DATOS
-                await page.wait_for_timeout(1000)
-                cards = await page.query_selector_all(".hall-list-item")
-
-                for card in cards:
-                    name_el = await card.query_selector(".list-item__nickname")
-                    name = await name_el.inner_text() if name_el else "N/A"
-
-                    price_el = await card.query_selector(".price-shower")
-                    raw_price = await price_el.inner_text() if price_el else None
-
-                    amount_el = await card.query_selector(".list_limit span span:first-child")
-                    raw_amount = await amount_el.inner_text() if amount_el else None
-                    
-                    all_results.append({
-                        "tipo": operation_type,
-                        "pagina": page_num,
-                        "merchant": name.strip(),
-                        "precio_bob": clean_number(raw_price),
-                        "monto_usdt": clean_number(raw_amount),
-                    })
-
-            return all_results
-
-        except Exception as e:
-            # Imprimimos el error, pero permitimos que continúe
-            print(f"Ocurrió un error en el scrapeo de {operation_type}: {e}")
-            return all_results
-        
-        finally:
-            await browser.close()
 
-
-def procesar_datos_html(data, estado):
+def preparar_tabla(data, estado):
     """
-    Procesa la lista de transacciones y genera el resultado en formato HTML.
-    
-    :param data: Lista de diccionarios con las transacciones.
+    Agrupa la lista de transacciones por precio y deja listos los valores que
+    pinta la plantilla `_tabla.html` (ya formateados: la plantilla no calcula).
+
+    :param data: Lista de diccionarios con las transacciones (o un BookSide ya en columnas).
     :param estado: 1 para 'ventas' (verde - Ofertas), 0 para 'compras' (rojo - Demandas).
-    :return: String HTML con la tabla de resultados.
+    :return: Diccionario con título, color, lado, volumen total y filas.
     """
-    # 1. Agrupación y Cálculo de Volumen Total
-    agrupado = defaultdict(lambda: {"suma": 0.0, "conteo": 0})
-    vol_total = 0.0
-    
-    for item in data:
-        precio = item.get("precio_bob")
-        cantidad = item.get("monto_usdt")
-        
-        # Validar datos
-        if precio is None or cantidad is None: continue
-        if precio == 0 or cantidad == 0: continue
-            
-        vol_total += cantidad
-        agrupado[precio]["suma"] += cantidad
-        agrupado[precio]["conteo"] += 1
-
-    # 2. Visualización
-    
     # Adaptación a la nomenclatura de Bybit
     if estado == 0:
         titulo = "🔴 Ofertas de Venta"
         color = "red"
         reverse_sort = True # Precio alto primero
+        lado = "compras"
     else:
         titulo = "🟢 Ofertas de Compra"
         color = "green"
         reverse_sort = False # Precio bajo primero
-    
-    # 3. Generación HTML
-    output_html = f"<h2>{titulo}</h2>"
-    output_html += f"<p style=font-size: 30px>Volumen: <strong>{vol_total:,.0f} USDT</strong></p>"
-    output_html += "<table border='1' style='width: 100%; border-collapse: collapse;'>"
-    output_html += f"<tr style='background-color: #f2f2f2; font-weight: bold;'><td>Precio</td><td>👤 Anuncios</td><td>💰 Volumen</td><td>Distribución</td></tr>"
-
-    datos_ordenados = sorted(agrupado.items(), key=lambda x: x[0], reverse=reverse_sort)
-    
-    for precio, valores in datos_ordenados:
-        # El factor de escala (30) es igual al ejemplo original de Bybit
-        modulo = int((valores['suma'] / vol_total) * 30) if vol_total > 0 else 0
-        barra = f"<span style='color: {color};'>{('⬛' * modulo)}</span>" # Usamos un carácter más grueso y coloreado
-
-        output_html += f"<tr>"
-        output_html += f"<td style='color: {color};'>{precio:,.2f}</td>"
-        output_html += f"<td>{valores['conteo']}</td>"
-        output_html += f"<td>{valores['suma']:,.0f}</td>"
-        output_html += f"<td>{barra}</td>"
-        output_html += f"</tr>"
-
-    output_html += "</table><hr>"
-    return output_html
-
-
-async def main_async():
-    """Ejecución asíncrona principal para el scraping."""
-    # Lanzar ambas tareas asíncronamente
-    ventas_task = scrape_bitget_p2p(URL_VENTAS, "ventas")
-    compras_task = scrape_bitget_p2p(URL_COMPRAS, "compras")
-
-    # Esperar a que ambas tareas finalicen
-    results = await asyncio.gather(ventas_task, compras_task)
-    
-    # IMPORTANTE: Asegúrate de que el orden de los resultados es correcto
-    # Tu código original tenía un intercambio:
-    # data_ventas = results[1]
-    # data_compras = results[0]
-    # Lo he corregido para que coincida con el orden de las tareas lanzadas (ventas_task, compras_task).
-    data_ventas = results[1]  # Venta de USDT (Side 1)
-    data_compras = results[0] # Compra de USDT (Side 0)
-    
-    return data_ventas, data_compras
-
-
-def obtener_datos_p2p_bitget():
-    """Ejecuta la lógica de scraping asíncrono y genera el HTML."""
-    output_html = "<h1>📈 BITGET (USDT/BOB)</h1><p style=font-size: 10px; color: #666;>By: Chelotex</p>"
-    
-    try:
-        # Ejecutar la función asíncrona dentro de la función síncrona de Flask
-        data_ventas, data_compras = asyncio.run(main_async())
-        
-    except Exception as e:
-        output_html += f"<p style='color: red;'>Error al ejecutar el scraping: {e}</p>"
-        return output_html
+        lado = "ventas"
 
-    # El bucle simula la lógica original de la API de Bybit:
-    # estado 1: Ventas/Ofertas; estado 0: Compras/Demandas
-    estados = [1, 0] 
+    # 1. Agrupación y Cálculo de Volumen Total (en columnas, ver analytics.py)
+    side = data if isinstance(data, BookSide) else BookSide(data, descending=reverse_sort)
+    precios, sumas, conteos = levels_arrays(side)
+    if reverse_sort:
+        precios, sumas, conteos = precios[::-1], sumas[::-1], conteos[::-1]
+    vol_total = float(sumas.sum())
+    # El factor de escala (30) es igual al ejemplo original de Bybit
+    modulos = (sumas / vol_total * 30).astype(int) if vol_total > 0 else np.zeros(len(sumas), dtype=int)
+
+    # 2. Visualización
+    filas = []
+    for precio, suma, conteo, modulo in zip(precios.tolist(), sumas.tolist(), conteos.tolist(), modulos.tolist()):
+        filas.append({
+            # data-price / data-volume los usa static/live.js para parchear la tabla en vivo
+            "precio": repr(precio),
+            "suma": repr(suma),
+            "precio_txt": f"{precio:,.2f}",
+            "conteo": conteo,
+            "suma_txt": f"{suma:,.0f}",
+            "barra": '⬛' * modulo,  # Usamos un carácter más grueso y coloreado
+        })
+
+    return {"titulo": titulo, "color": color, "lado": lado, "vol_total": f"{vol_total:,.0f}", "filas": filas}
+
+
+def procesar_datos_html(data, estado):
+    """
+    Procesa la lista de transacciones y genera el resultado en formato HTML.
 
-    for estado in estados:
-        if estado == 1:
-            # Procesar las 'Ofertas de Compra' (gente que vende USDT, Side 1)
-            output_html += procesar_datos_html(data_ventas, estado)
-        elif estado == 0:
-            # Procesar las 'Ofertas de Venta' (gente que compra USDT, Side 0)
-            output_html += procesar_datos_html(data_compras, estado)
-            
-    return output_html
+    :param data: Lista de diccionarios con las transacciones.
+    :param estado: 1 para 'ventas' (verde - Ofertas), 0 para 'compras' (rojo - Demandas).
+    :return: String HTML con la tabla de resultados.
+    """
+    return app.jinja_env.get_template("_tabla.html").render(tabla=preparar_tabla(data, estado))
+
+
+def contexto_pagina(market, snapshot, last_error):
+    """Variables de `templates/index.html` para `market` a partir de `snapshot` (o None, en frío)."""
+    contexto = {
+        "market": market,
+        "markets": MARKETS,
+        "snapshot": snapshot,
+        "last_error": last_error,
+        # Snapshot guardado antes del último reinicio: se muestra hasta que llegue uno nuevo
+        "restaurado": any(snapshot is s for s in restored),
+    }
+    if snapshot is None:
+        return contexto
+
+    # El bucle simula la lógica original de la API de Bybit:
+    # estado 1: Ventas/Ofertas ('Ofertas de Compra', gente que vende USDT, Side 1)
+    # estado 0: Compras/Demandas ('Ofertas de Venta', gente que compra USDT, Side 0)
+    asks, bids = book_sides(snapshot)
+    contexto["tablas"] = [preparar_tabla(asks, 1), preparar_tabla(bids, 0)]
+    # Hora absoluta: la página se cachea por versión; la antigüedad la lleva live.js
+    contexto["actualizado"] = time.strftime("%H:%M:%S UTC", time.gmtime(snapshot.created_at))
+    contexto["browser_report"] = default_browser_manager.report()
+    contexto["resumen"] = book_stats(summarize(snapshot))
+    return contexto
+
+
+# ----------------- REFRESCO EN SEGUNDO PLANO -----------------
+# El planificador scrapea cada mercado registrado (ver markets.py / P2P_MARKETS)
+# en un hilo propio; las vistas solo leen el último snapshot publicado.
+# Cada petición que espera ocupa un hilo del servidor: la espera en frío es corta
+COLD_START_TIMEOUT = float(os.environ.get('COLD_START_TIMEOUT', 2))
+
+snapshot_store = SnapshotStore()
+
+# Cambios por nivel de precio empujados a los navegadores por SSE
+broadcaster = Broadcaster()
+snapshot_store.subscribe(broadcaster.on_snapshot)
+
+# Las conexiones en vivo cuentan como "alguien mirando" para la cadencia adaptativa
+# y cada BROWSER_HEALTH_CHECK_INTERVAL segundos se comprueba que Chromium no esté colgado
+scheduler = MarketScheduler(snapshot_store, MARKETS, fetch_market, EXCHANGES, viewers=broadcaster.viewers,
+                            health_check=default_browser_manager.health_check,
+                            health_interval=HEALTH_CHECK_INTERVAL)
+
+# Último snapshot de cada mercado en disco: tras un reinicio se sirve enseguida
+# (marcado con su antigüedad) mientras el planificador trae datos nuevos
+snapshot_file = SnapshotFile()
+restored = [s for s in map(snapshot_store.restore, snapshot_file.load()) if s is not None]
+snapshot_store.subscribe(snapshot_file.record)
+
+# Historial en disco (HISTORY_DB vacío lo desactiva); se escribe en lotes desde su propio hilo
+history = HistoryStore() if HISTORY_DB else None
+if history is not None:
+    snapshot_store.subscribe(history.record)
+
+
+# ----------------- ARRANQUE -----------------
+# El servidor escucha apenas se importa la app: Chromium y el primer scrapeo se
+# preparan en segundo plano (el planificador arranca con el worker, ver
+# gunicorn.conf.py). Mientras tanto se sirve el snapshot restaurado o la página
+# de "cargando". /healthz dice si el proceso vive; /readyz si ya hay datos.
+BOOT_SECONDS = REGISTRY.gauge(
+    "p2p_boot_seconds", "Segundos desde el arranque hasta cada hito (import, restored, first_byte, first_data)",
+    ("milestone",))
+
+
+class BootTimer:
+    """Registra (una sola vez cada uno) los hitos del arranque y los imprime."""
+
+    def __init__(self, started):
+        self.started = started
+        self.milestones = {}
+        self._lock = threading.Lock()
+
+    def mark(self, milestone, detail=""):
+        with self._lock:
+            if milestone in self.milestones:
+                return
+            seconds = self.milestones[milestone] = round(time.monotonic() - self.started, 3)
+        BOOT_SECONDS.set(seconds, milestone=milestone)
+        print(f"Arranque: {milestone} a los {seconds:.2f} s{detail}")
+
+
+boot = BootTimer(BOOT_STARTED)
+if restored:
+    boot.mark("restored", f" ({len(restored)} mercados desde {snapshot_file.path})")
+# Los restaurados no cuentan: solo un scrapeo de este proceso son "primeros datos"
+snapshot_store.subscribe(lambda snapshot: boot.mark("first_data", f" ({snapshot.market})"))
+
+
+@app.after_request
+def marcar_primer_byte(response):
+    boot.mark("first_byte", f" ({request.path})")
+    return response
+
+
+def render_pagina(market):
+    """
+    Página HTML completa de `market`. Se renderiza y comprime una sola vez por
+    versión de snapshot (y por error mostrado); después es una búsqueda en la
+    caché de http_cache, con ETag y 304 como la API: el contexto (tablas, resumen)
+    solo se arma cuando hay que renderizar.
+    """
+    # Nunca se scrapea aquí: se lee el último snapshot (en arranque en frío, como mucho
+    # COLD_START_TIMEOUT segundos; después se sirve la página de espera, que se recarga sola)
+    snapshot = scheduler.get(market.key, timeout=COLD_START_TIMEOUT)
+    last_error = scheduler.last_error(market.key)
+    if snapshot is None:
+        # Arranque en frío: página de espera que se recarga sola, sin cachear
+        return render_template("index.html", **contexto_pagina(market, None, last_error))
+
+    etag = snapshot_etag(snapshot, "page")
+    if last_error:
+        etag += f"-e{zlib.crc32(last_error.encode()):08x}"
+    return cached_response(
+        etag,
+        lambda: render_template("index.html", **contexto_pagina(market, snapshot, last_error)).encode("utf-8"),
+        "text/html",
+    )
 
 
 @app.route('/')
 def index():
-    """Ruta principal que llama a la función de obtención de datos y renderiza el HTML."""
-    html_content = obtener_datos_p2p_bitget()
-    
-    # Estructura HTML completa con auto-refresh y estilos, igual al ejemplo de Bybit
-    full_html = f"""
-    <!DOCTYPE html>
-    <html lang="es">
-    <head>
-        <meta charset="UTF-8">
-        <title>Reporte P2P Bitget</title>
-        <meta http-equiv="refresh" content="50"> 
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px; }}
-            h1, h2 {{ color: #333; }}
-            table {{ margin-top: 15px; border: 1px solid #ccc; }}
-            td, th {{ padding: 8px 12px; text-align: left; }}
-            tr:nth-child(even) {{ background-color: #f9f9f9; }}
-            hr {{ border: 0; border-top: 1px solid #eee; margin: 20px 0; }}
-        </style>
-    </head>
-    <body>
-        {html_content}
-    </body>
-    </html>
+    """Ruta principal: el mercado por defecto (el primero de P2P_MARKETS)."""
+    return render_pagina(DEFAULT_MARKET)
+
+
+@app.route('/market/<exchange>/<asset>/<fiat>')
+def market_page(exchange, asset, fiat):
+    """Página de cualquier mercado registrado, p. ej. /market/bitget/USDT/ARS."""
+    market = get_market(exchange, asset, fiat)
+    if market is None:
+        abort(404)
+    return render_pagina(market)
+
+@app.route('/stream', defaults={'exchange': None, 'asset': None, 'fiat': None})
+@app.route('/stream/<exchange>/<asset>/<fiat>')
+def stream(exchange, asset, fiat):
+    """Server-Sent Events con los cambios del libro de un mercado."""
+    market = resolver_mercado(exchange, asset, fiat)
+    scheduler.start()
+    if not broadcaster.reserve():
+        # Sin lugar: el navegador consulta /api/levels cada tanto en lugar de quedarse conectado
+        response = jsonify({"market": market.key, "error": "Demasiadas conexiones en vivo.", "poll": "/api/levels"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "60"
+        return response
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    response = Response(
+        broadcaster.stream(market.key, last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Se libera al cerrar la respuesta, aunque el generador no llegue a empezar
+    response.call_on_close(broadcaster.release)
+    return response
+
+
+# ----------------- API JSON -----------------
+# Se sirven desde el último snapshot, con ETag por versión (304 si no cambió) y
+# el cuerpo comprimido y cacheado una sola vez por versión (ver http_cache.py).
+
+def resolver_mercado(exchange, asset, fiat):
+    """Mercado de la ruta, o el mercado por defecto si la ruta no lo indica."""
+    if exchange is None:
+        return DEFAULT_MARKET
+    market = get_market(exchange, asset, fiat)
+    if market is None:
+        abort(404)
+    return market
+
+
+def api_sin_datos(market):
+    """503 mientras el mercado todavía no tiene ningún snapshot."""
+    response = jsonify({"market": market.key, "error": "Todavía no hay datos, la primera actualización está en curso."})
+    response.status_code = 503
+    response.headers["Retry-After"] = "10"
+    return response
+
+
+# Intervalos aceptados en `?bucket=`: cada uno es una entrada más en las cachés de
+# respuestas y de análisis, así que la lista es corta y cualquier otro valor da 400
+ORDERBOOK_BUCKETS = tuple(float(b) for b in os.environ.get('ORDERBOOK_BUCKETS', '0.01,0.05,0.1,0.5,1').split(','))
+
+
+def orderbook_payload(snapshot, bucket=None):
+    summary = summarize(snapshot, bucket)
+    asks, bids = book_sides(snapshot)
+    return {
+        "market": snapshot.market,
+        "version": snapshot.version,
+        "created_at": snapshot.created_at,
+        "complete": snapshot.complete,
+        "pages": snapshot.pages,
+        "bucket": bucket,
+        "asks": {"adverts": list(snapshot.data_ventas), "levels": summary["levels"]["asks"],
+                 "depth": depth_curve(asks, bucket)},
+        "bids": {"adverts": list(snapshot.data_compras), "levels": summary["levels"]["bids"],
+                 "depth": depth_curve(bids, bucket)},
+    }
+
+
+def summary_payload(snapshot):
+    # El resumen está cacheado y compartido: se copia sin los niveles en vez de modificarlo
+    summary = {k: v for k, v in summarize(snapshot).items() if k != "levels"}
+    return {
+        "market": snapshot.market,
+        "version": snapshot.version,
+        "created_at": snapshot.created_at,
+        "complete": snapshot.complete,
+        "pages": snapshot.pages,
+        **summary,
+        "volume_total": round(summary["depth_bid"] + summary["depth_ask"], 8),
+    }
+
+
+@app.route('/api/levels', defaults={'exchange': None, 'asset': None, 'fiat': None})
+@app.route('/api/levels/<exchange>/<asset>/<fiat>')
+def levels_api(exchange, asset, fiat):
+    """Niveles de precio y estadísticas (lo mismo que el evento SSE "snapshot"): la consulta de live.js sin SSE."""
+    market = resolver_mercado(exchange, asset, fiat)
+    snapshot = scheduler.get(market.key, timeout=0)
+    if snapshot is None:
+        return api_sin_datos(market)
+
+    def build():
+        summary = summarize(snapshot)
+        return levels_payload(snapshot, summary["levels"], book_stats(summary))
+
+    return cached_json(snapshot_etag(snapshot, "levels"), build)
+
+
+@app.route('/api/orderbook', defaults={'exchange': None, 'asset': None, 'fiat': None})
+@app.route('/api/orderbook/<exchange>/<asset>/<fiat>')
+def orderbook_api(exchange, asset, fiat):
+    """
+    Anuncios crudos, niveles de precio agregados y profundidad acumulada de ambos
+    lados. `?bucket=0.05` agrupa los niveles en intervalos de ese tamaño (ver ORDERBOOK_BUCKETS).
+    """
+    market = resolver_mercado(exchange, asset, fiat)
+    bucket = request.args.get('bucket', type=float)
+    if bucket is not None and bucket not in ORDERBOOK_BUCKETS:
+        abort(400)
+    snapshot = scheduler.get(market.key, timeout=0)
+    if snapshot is None:
+        return api_sin_datos(market)
+    name = f"orderbook-b{bucket!r}" if bucket else "orderbook"
+    return cached_json(snapshot_etag(snapshot, name), lambda: orderbook_payload(snapshot, bucket))
+
+
+@app.route('/api/summary', defaults={'exchange': None, 'asset': None, 'fiat': None})
+@app.route('/api/summary/<exchange>/<asset>/<fiat>')
+def summary_api(exchange, asset, fiat):
+    """Mejores precios, spread, VWAP de llenado, concentración por merchant y volumen total."""
+    market = resolver_mercado(exchange, asset, fiat)
+    snapshot = scheduler.get(market.key, timeout=0)
+    if snapshot is None:
+        return api_sin_datos(market)
+    return cached_json(snapshot_etag(snapshot, "summary"), lambda: summary_payload(snapshot))
+
+
+HISTORY_MAX_TS = 253402300799  # 9999-12-31: más allá no hay historial posible
+
+
+@app.route('/api/history/<exchange>/<asset>/<fiat>')
+def history_api(exchange, asset, fiat):
+    """
+    Historial de un mercado. Parámetros (opcionales):
+    start / end en segundos unix (por defecto, las últimas 24 h) y
+    metric = best_prices | spread | depth | all.
+    """
+    market = get_market(exchange, asset, fiat)
+    if market is None or history is None:
+        abort(404)
+    end = request.args.get('end', type=float) or time.time()
+    start = request.args.get('start', type=float) or end - 86400
+    # nan/inf (o fechas fuera de rango) no llegan a int() ni a SQLite
+    if not (math.isfinite(start) and math.isfinite(end) and 0 <= start <= end <= HISTORY_MAX_TS):
+        abort(400)
+    queries = {
+        "best_prices": history.best_prices,
+        "spread": history.spread,
+        "depth": history.depth,
+        "all": history.query,
+    }
+    query = queries.get(request.args.get('metric', 'all'))
+    if query is None:
+        abort(400)
+    return jsonify({"market": market.key, "start": start, "end": end, "rows": query(market.key, start, end)})
+
+# ----------------- MÉTRICAS -----------------
+# Contadores y fases del scrapeo (scraper.py, metrics.py), del navegador y del
+# planificador, más estos gauges que se leen al momento de exportar.
+SNAPSHOT_AGE = REGISTRY.gauge("p2p_snapshot_age_seconds", "Antigüedad del último snapshot", ("market",))
+SNAPSHOT_ADVERTS = REGISTRY.gauge("p2p_snapshot_adverts", "Anuncios del último snapshot", ("market", "side"))
+SSE_VIEWERS = REGISTRY.gauge("p2p_sse_viewers", "Conexiones SSE abiertas", ("market",))
+SSE_REJECTED = REGISTRY.gauge("p2p_sse_rejected", "Conexiones SSE rechazadas por el tope SSE_MAX_CONNECTIONS")
+HTTP_CACHE = REGISTRY.gauge("p2p_http_cache_lookups", "Búsquedas en la caché de respuestas", ("result",))
+HISTORY_DROPPED = REGISTRY.gauge("p2p_history_dropped", "Snapshots descartados por el historial (cola llena)")
+
+
+@REGISTRY.collector
+def recolectar_estado():
+    for snapshot in snapshot_store.all_latest().values():
+        SNAPSHOT_AGE.set(round(snapshot.age, 3), market=snapshot.market)
+        SNAPSHOT_ADVERTS.set(len(snapshot.data_ventas), market=snapshot.market, side="asks")
+        SNAPSHOT_ADVERTS.set(len(snapshot.data_compras), market=snapshot.market, side="bids")
+    for market in MARKETS:
+        SSE_VIEWERS.set(broadcaster.viewers(market.key), market=market.key)
+    SSE_REJECTED.set(broadcaster.connections_rejected)
+    HTTP_CACHE.set(encoded_cache.hits, result="hit")
+    HTTP_CACHE.set(encoded_cache.misses, result="miss")
+    if history is not None:
+        HISTORY_DROPPED.set(history.dropped)
+
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: el proceso responde (no depende de que haya datos ni navegador)."""
+    return jsonify({"status": "ok", "uptime_s": round(time.monotonic() - BOOT_STARTED, 3)})
+
+
+@app.route('/readyz')
+def readyz():
     """
-    return render_template_string(full_html)
+    Readiness: 200 cuando el mercado principal tiene un snapshot para servir
+    (recién scrapeado o restaurado de disco), 503 mientras todavía se calienta.
+    """
+    markets = {}
+    for market in MARKETS:
+        snapshot = snapshot_store.latest(market.key)
+        markets[market.key] = {
+            "snapshot": snapshot is not None,
+            "age_s": round(snapshot.age, 3) if snapshot is not None else None,
+            "restored": any(snapshot is s for s in restored),
+            "last_error": scheduler.last_error(market.key),
+        }
+    ready = markets[DEFAULT_MARKET.key]["snapshot"]
+    response = jsonify({
+        "ready": ready,
+        "markets": markets,
+        "browser": default_browser_manager.is_healthy(),
+        "boot": boot.milestones,
+    })
+    if not ready:
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """Métricas en el formato de texto de Prometheus."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+boot.mark("import")
+
 
 if __name__ == '__main__':
-    # Ejecuta el servidor Flask
-    # El servidor se ejecutará en http://127.0.0.1:5000/
-    port = int(os.environ.get('PORT', 5000)) 
-    # Usar app.run con debug=False para evitar problemas de anidamiento de asyncio.run
-    print(f"Iniciando servidor Flask en el puerto {port}...")
-    app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
\ No newline at end of file
+    # Servidor de desarrollo de Flask (http://127.0.0.1:5000/).
+    # En producción se sirve con gunicorn: gunicorn -c gunicorn.conf.py app:app
+    port = int(os.environ.get('PORT', 5000))
+    print(f"Iniciando servidor Flask (desarrollo) en el puerto {port}...")
+    scheduler.start()
+    app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False, threaded=True)
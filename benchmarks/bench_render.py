@@ -0,0 +1,118 @@
+"""
+Peticiones por segundo de la página principal, antes y después de la caché de render.
+
+"antes" reproduce el camino anterior: HTML armado con concatenación de strings y
+`render_template_string` en cada petición. "después" es `/` tal como se sirve
+ahora (plantilla precompilada y cuerpo cacheado por versión de snapshot).
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_render.py [--adverts 400] [--requests 500]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HISTORY_DB', '')  # sin historial en disco durante la medición
+os.environ['SNAPSHOT_FILE'] = ''  # nunca el último snapshot: el libro sintético se restauraría como real
+
+from flask import render_template_string  # noqa: E402
+
+import app as servidor  # noqa: E402
+from markets import DEFAULT_MARKET  # noqa: E402
+
+
+def adverts_sinteticos(cantidad, tipo, base):
+    return [
+        {
+            "tipo": tipo,
+            "pagina": 1 + i // 10,
+            "merchant": f"merchant-{i}",
+            "precio_bob": round(base + random.randint(0, 60) / 100, 2),
+            "monto_usdt": round(random.uniform(10, 5000), 2),
+        }
+        for i in range(cantidad)
+    ]
+
+
+def tabla_legacy(data, estado):
+    """El render anterior de una tabla: concatenación de strings por fila."""
+    agrupado = defaultdict(lambda: {"suma": 0.0, "conteo": 0})
+    vol_total = 0.0
+    for item in data:
+        precio, cantidad = item.get("precio_bob"), item.get("monto_usdt")
+        if not precio or not cantidad:
+            continue
+        vol_total += cantidad
+        agrupado[precio]["suma"] += cantidad
+        agrupado[precio]["conteo"] += 1
+    color, lado = ("red", "compras") if estado == 0 else ("green", "ventas")
+    html = f"<h2>Tabla</h2><p>Volumen: <strong id='volumen-{lado}'>{vol_total:,.0f} USDT</strong></p>"
+    html += f"<table id='tabla-{lado}'>"
+    for precio, valores in sorted(agrupado.items(), reverse=estado == 0):
+        modulo = int((valores['suma'] / vol_total) * 30) if vol_total > 0 else 0
+        html += f"<tr data-price='{precio!r}' data-volume='{valores['suma']!r}'>"
+        html += f"<td style='color: {color};'>{precio:,.2f}</td>"
+        html += f"<td>{valores['conteo']}</td>"
+        html += f"<td>{valores['suma']:,.0f}</td>"
+        html += f"<td><span style='color: {color};'>{'⬛' * modulo}</span></td></tr>"
+    return html + "</table><hr>"
+
+
+@servidor.app.route('/_bench/legacy')
+def pagina_legacy():
+    snapshot = servidor.scheduler.get(DEFAULT_MARKET.key, timeout=0)
+    contenido = tabla_legacy(snapshot.data_ventas, 1) + tabla_legacy(snapshot.data_compras, 0)
+    return render_template_string(f"""
+    <!DOCTYPE html>
+    <html lang="es"><head><meta charset="UTF-8"><title>{DEFAULT_MARKET.title}</title>
+    <style> body {{ font-family: Arial, sans-serif; }} </style></head>
+    <body>{contenido}</body></html>
+    """)
+
+
+def medir(client, path, requests, headers=None):
+    client.get(path, headers=headers)  # calentamiento (compila la plantilla / llena la caché)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, len(response.data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--adverts", type=int, default=400, help="anuncios por lado en el snapshot sintético")
+    parser.add_argument("--requests", type=int, default=500, help="peticiones por escenario")
+    args = parser.parse_args()
+
+    servidor.scheduler.start = lambda: None   # nada de scraping real durante la medición
+    servidor.snapshot_store.publish(
+        DEFAULT_MARKET.key,
+        adverts_sinteticos(args.adverts, "compras", 6.90),
+        adverts_sinteticos(args.adverts, "ventas", 6.80),
+        1.0,
+    )
+    client = servidor.app.test_client()
+
+    escenarios = [
+        ("antes (render_template_string)", "/_bench/legacy", None),
+        ("después (caché por versión)", "/", None),
+        ("después, gzip", "/", {"Accept-Encoding": "gzip"}),
+    ]
+    print(f"{args.adverts} anuncios por lado, {args.requests} peticiones por escenario")
+    resultados = {}
+    for nombre, path, headers in escenarios:
+        rps, size = medir(client, path, args.requests, headers)
+        resultados[nombre] = rps
+        print(f"  {nombre:<32} {rps:>9,.0f} req/s   {size:>8,} bytes")
+    antes = resultados[escenarios[0][0]]
+    print(f"Mejora: x{resultados[escenarios[1][0]] / antes:.1f}")
+
+
+if __name__ == "__main__":
+    main()
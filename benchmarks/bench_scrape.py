@@ -0,0 +1,220 @@
+"""
+Benchmark sin red del scraper y de la agregación, contra el hall falso de fixture_server.py.
+
+Mide:
+  - scrape_bitget_p2p por origen (red y DOM): latencia p50/p95/p99 y anuncios/s
+  - clean_number y procesar_datos_html: latencia por llamada y llamadas/s
+  - memoria residente máxima del proceso y del navegador durante la corrida
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_scrape.py [--adverts 10] [--pages 5] [--latency 0.05] [--runs 5] [--json out.json]
+
+Con --json el resultado queda en un archivo para comparar entre cambios.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('HISTORY_DB', '')  # sin historial en disco durante la medición
+os.environ['SNAPSHOT_FILE'] = ''  # nunca el último snapshot: el libro sintético se restauraría como real
+
+from fixture_server import FixtureServer, HallFixture  # noqa: E402
+
+import metrics  # noqa: E402
+from browser_pool import BrowserManager  # noqa: E402
+from scraper import DeepPageCache, clean_number, scrape_bitget_p2p  # noqa: E402
+from storage_state import StorageStateStore  # noqa: E402
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def describe(latencies, items=None):
+    """p50/p95/p99 (ms) y, si se indica, elementos procesados por segundo."""
+    total = sum(latencies)
+    result = {
+        "runs": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+    if items is not None and total > 0:
+        result["per_s"] = round(items / total, 1)
+    return result
+
+
+class PeakMemory:
+    """Muestrea la memoria del proceso y de sus hijos (Chromium) y guarda el máximo."""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.process_peak = 0
+        self.browser_peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bench-rss", daemon=True)
+
+    def _sample(self):
+        metrics.collect_process_usage()
+        self.process_peak = max(self.process_peak, metrics.PROCESS_RSS.value() or 0)
+        browser = sum(metrics.BROWSER_RSS.value(process=kind) or 0 for kind in ("chromium", "driver"))
+        self.browser_peak = max(self.browser_peak, browser)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        # ru_maxrss (KB en Linux) atrapa picos más cortos que el intervalo de muestreo
+        self.process_peak = max(self.process_peak, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+async def bench_scrape(server, sources, runs, max_pages):
+    manager = BrowserManager()
+    # El hall falso es determinista: con la caché de páginas del proceso, desde la segunda
+    # corrida solo se leería la página 1. Estado del navegador solo en memoria (no toca data/)
+    options = {"browser_manager": manager, "deep_cache": DeepPageCache(max_age=0),
+               "storage_states": StorageStateStore(path="")}
+    results = {}
+    try:
+        # Primer scrapeo fuera de la medición: lanza Chromium (eso lo mide el informe en frío / caliente)
+        await scrape_bitget_p2p(server.url("ventas"), "ventas", max_pages=1, **options)
+        for source in sources:
+            latencies, adverts, failed = [], 0, 0
+            for i in range(runs):
+                side = "ventas" if i % 2 == 0 else "compras"
+                start = time.perf_counter()
+                records = await scrape_bitget_p2p(server.url(side), side, source=source, max_pages=max_pages,
+                                                  **options)
+                elapsed = time.perf_counter() - start
+                # Un scrapeo fallido suele ser más rápido que uno bueno: no entra en la medición
+                if records.outcome != "ok":
+                    failed += 1
+                    print(f"⚠️ scrape ({source}) de {side}: {records.outcome} ({records.error})", file=sys.stderr)
+                    continue
+                latencies.append(elapsed)
+                adverts += len(records)
+            results[source] = {"runs": 0, "failed": failed}
+            if latencies:
+                results[source] = {**describe(latencies, adverts), "failed": failed,
+                                   "adverts_per_run": adverts / len(latencies)}
+        results["browser"] = manager.stats()
+    finally:
+        await manager.close()
+    return results
+
+
+def bench_clean_number(samples, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in samples:
+            clean_number(text)
+        latencies.append((time.perf_counter() - start) / len(samples))
+    return {**describe(latencies), "per_s": round(1 / (sum(latencies) / len(latencies)), 1)}
+
+
+def bench_procesar_datos_html(records, repeat):
+    # app importa el planificador pero no lo arranca: solo se usa el render de tablas
+    from app import app, procesar_datos_html
+    latencies = []
+    with app.app_context():
+        for _ in range(repeat):
+            start = time.perf_counter()
+            procesar_datos_html(records, 1)
+            procesar_datos_html(records, 0)
+            latencies.append(time.perf_counter() - start)
+    return describe(latencies, len(records) * 2 * repeat)
+
+
+def synthetic_records(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "tipo": "ventas",
+            "pagina": 1 + i // 10,
+            "merchant": f"merchant_{i}",
+            "precio_bob": round(6.80 + rng.randint(0, 80) / 100, 2),
+            "monto_usdt": round(rng.uniform(20, 25000), 2),
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sin red del scraper y la agregación.")
+    parser.add_argument("--adverts", type=int, default=10, help="anuncios por página del hall falso")
+    parser.add_argument("--pages", type=int, default=5, help="páginas por lado del hall falso")
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos de demora por respuesta del hall")
+    parser.add_argument("--runs", type=int, default=5, help="scrapeos por origen")
+    parser.add_argument("--sources", default="network,dom", help="orígenes a medir, separados por coma")
+    parser.add_argument("--records", type=int, default=5000, help="registros para procesar_datos_html")
+    parser.add_argument("--skip-scrape", action="store_true", help="solo las funciones puras (sin navegador)")
+    parser.add_argument("--json", help="guardar el resultado en este archivo")
+    args = parser.parse_args()
+
+    report = {
+        "params": vars(args),
+        "python": sys.version.split()[0],
+    }
+    fixture = HallFixture(args.adverts, args.pages)
+    texts = [f"{a['price']:,.2f} BOB" for p in range(1, args.pages + 1) for a in fixture.page("ventas", p)]
+    texts += [f"≈ {a['lastAmount']:,.2f} USDT" for p in range(1, args.pages + 1) for a in fixture.page("compras", p)]
+
+    with PeakMemory() as memory:
+        report["clean_number"] = bench_clean_number(texts * max(1, 2000 // max(len(texts), 1)), repeat=50)
+        report["procesar_datos_html"] = bench_procesar_datos_html(synthetic_records(args.records), repeat=20)
+        if not args.skip_scrape:
+            with FixtureServer(fixture, latency=args.latency) as server:
+                report["scrape"] = asyncio.run(bench_scrape(
+                    server, [s.strip() for s in args.sources.split(",") if s.strip()], args.runs, args.pages))
+    report["peak_rss_bytes"] = {"process": memory.process_peak, "browser": memory.browser_peak}
+
+    print(f"Hall falso: {args.pages} páginas x {args.adverts} anuncios, demora {args.latency * 1000:.0f} ms")
+    for name, unit in (("clean_number", "llamadas"), ("procesar_datos_html", "registros")):
+        r = report[name]
+        print(f"  {name:<22} p50 {r['p50_ms']:.4f} ms  p95 {r['p95_ms']:.4f} ms  {r['per_s']:>12,.0f} {unit}/s")
+    failed = 0
+    for source, r in report.get("scrape", {}).items():
+        if source == "browser":
+            continue
+        failed += r["failed"]
+        if not r["runs"]:
+            print(f"  scrape ({source:<7})       sin scrapeos exitosos ({r['failed']} fallidos)")
+            continue
+        print(f"  scrape ({source:<7})       p50 {r['p50_ms']:.0f} ms  p95 {r['p95_ms']:.0f} ms  "
+              f"p99 {r['p99_ms']:.0f} ms  {r.get('per_s', 0):,.0f} anuncios/s  ({r['adverts_per_run']:.0f} por scrapeo)"
+              + (f"  {r['failed']} fallidos" if r["failed"] else ""))
+    peak = report["peak_rss_bytes"]
+    print(f"  RSS máximo: proceso {peak['process'] / 2**20:,.0f} MB, navegador {peak['browser'] / 2**20:,.0f} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultado guardado en {args.json}")
+    if failed:
+        sys.exit(f"❌ {failed} scrapeos no terminaron bien: la medición no es válida")
+
+
+if __name__ == "__main__":
+    main()
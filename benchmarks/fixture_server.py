@@ -0,0 +1,235 @@
+"""
+Servidor local que imita el hall P2P de Bitget, para medir sin salir a internet.
+
+Sirve:
+  /p2p-trade?...        lado "compras" (la gente COMPRA USDT)
+  /p2p-trade/sell?...   lado "ventas" (la gente VENDE USDT)
+  /v1/p2p/advList       API JSON de la lista (POST {"side", "pageNo"}), la que lee el modo red
+
+La página reproduce la estructura que usa el scraper: tarjetas `.hall-list-item`
+con `.list-item__nickname`, `.price-shower` y `.list_limit`, el paginador
+`.bit-pager li.number` (con `.active`), el modal `.bit-dialog__close` y el botón
+de cookies. La lista se pide por XHR y se dibuja en el navegador, igual que en Bitget.
+
+Uso independiente:
+    python benchmarks/fixture_server.py --adverts 10 --pages 5 --latency 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+API_PATH = "/v1/p2p/advList"
+
+PAGE_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="UTF-8">
+<title>P2P fixture</title>
+<style>
+  .bit-dialog { position: fixed; inset: 0; background: rgba(0,0,0,.4); }
+  .bit-dialog.hidden, .cookie-bar.hidden { display: none; }
+  .bit-pager li { display: inline-block; padding: 4px 8px; cursor: pointer; }
+  .bit-pager li.active { font-weight: bold; }
+</style>
+</head>
+<body>
+<div class="hall-list"></div>
+<ul class="bit-pager"></ul>
+<div class="bit-dialog __DIALOG__"><button class="bit-dialog__close">x</button></div>
+<div class="cookie-bar __DIALOG__"><button data-testid="MicroCookieAcceptButton">OK</button></div>
+<script>
+(function () {
+  var SIDE = "__SIDE__", PAGES = __PAGES__;
+  var list = document.querySelector(".hall-list");
+  var pager = document.querySelector(".bit-pager");
+
+  function fmt(value, decimals) {
+    return Number(value).toLocaleString("en-US", { minimumFractionDigits: decimals, maximumFractionDigits: decimals });
+  }
+
+  function render(page, adverts) {
+    list.innerHTML = adverts.map(function (a) {
+      return '<div class="hall-list-item">' +
+        '<span class="list-item__nickname">' + a.nickName + '</span>' +
+        '<span class="price-shower">' + fmt(a.price, 2) + ' BOB</span>' +
+        '<div class="list_limit"><span><span>' + fmt(a.lastAmount, 2) + ' USDT</span><span>Límite</span></span></div>' +
+        '</div>';
+    }).join("");
+    var html = "";
+    // Como Bitget: solo los números cercanos a la página activa
+    for (var n = Math.max(1, page - 2); n <= Math.min(PAGES, page + 2); n++) {
+      html += '<li class="number' + (n === page ? ' active' : '') + '" data-page="' + n + '">' + n + '</li>';
+    }
+    pager.innerHTML = html;
+  }
+
+  function load(page) {
+    fetch("__API__", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ side: SIDE, pageNo: page, pageSize: 10 })
+    }).then(function (r) { return r.json(); })
+      .then(function (payload) { render(page, payload.data.dataList); });
+  }
+
+  pager.addEventListener("click", function (e) {
+    var li = e.target.closest("li.number");
+    if (li) load(Number(li.dataset.page));
+  });
+  document.querySelectorAll(".bit-dialog__close, [data-testid=MicroCookieAcceptButton]").forEach(function (b) {
+    b.addEventListener("click", function () { b.parentElement.classList.add("hidden"); });
+  });
+  load(1);
+})();
+</script>
+</body>
+</html>
+"""
+
+
+class HallFixture:
+    """Anuncios sintéticos (o grabados) por lado y página, deterministas por `seed`."""
+
+    def __init__(self, adverts_per_page=10, pages=5, seed=1, recorded=None):
+        self.adverts_per_page = adverts_per_page
+        self.pages = pages
+        self.seed = seed
+        # recorded: {"ventas": [[anuncio, ...] por página], "compras": [...]} con campos nickName/price/lastAmount
+        self.recorded = recorded
+
+    def page(self, side, page_num):
+        if self.recorded is not None:
+            pages = self.recorded.get(side, [])
+            return pages[page_num - 1] if 1 <= page_num <= len(pages) else []
+        if not 1 <= page_num <= self.pages:
+            return []
+        rng = random.Random(f"{self.seed}-{side}-{page_num}")
+        # Ventas de USDT ordenadas de más barata a más cara; compras al revés
+        base = 6.90 if side == "ventas" else 6.85
+        step = 0.01 if side == "ventas" else -0.01
+        start = (page_num - 1) * self.adverts_per_page
+        return [
+            {
+                "nickName": f"merchant_{side}_{start + i}",
+                "price": round(base + step * ((start + i) // 3), 2),
+                "lastAmount": round(rng.uniform(20, 25000), 2),
+            }
+            for i in range(self.adverts_per_page)
+        ]
+
+    @property
+    def page_count(self):
+        if self.recorded is not None:
+            return max((len(p) for p in self.recorded.values()), default=0)
+        return self.pages
+
+
+def _side_for_path(path):
+    return "ventas" if path.rstrip("/").endswith("/sell") else "compras"
+
+
+def make_handler(fixture, latency, dialog=True):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if not path.startswith("/p2p-trade"):
+                self._send(404, b"not found", "text/plain")
+                return
+            time.sleep(latency)
+            html = (PAGE_HTML
+                    .replace("__SIDE__", _side_for_path(path))
+                    .replace("__PAGES__", str(fixture.page_count))
+                    .replace("__API__", API_PATH)
+                    .replace("__DIALOG__", "" if dialog else "hidden"))
+            self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+
+        def do_POST(self):
+            if urlparse(self.path).path != API_PATH:
+                self._send(404, b"not found", "text/plain")
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                body = {}
+            time.sleep(latency)
+            adverts = fixture.page(body.get("side", "ventas"), int(body.get("pageNo", 1)))
+            payload = {"code": "00000", "data": {"pageNo": body.get("pageNo", 1), "dataList": adverts}}
+            self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
+
+    return Handler
+
+
+class FixtureServer:
+    """El servidor en un hilo propio; `url(side)` da la URL a pasar a `scrape_bitget_p2p`."""
+
+    def __init__(self, fixture, latency=0.0, dialog=True, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(fixture, latency, dialog))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, side):
+        path = "/p2p-trade/sell" if side == "ventas" else "/p2p-trade"
+        return f"{self.base_url}{path}?paymethodIds=-1&fiatName=BOB"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="p2p-fixture", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hall P2P falso para pruebas sin red.")
+    parser.add_argument("--adverts", type=int, default=10, help="anuncios por página")
+    parser.add_argument("--pages", type=int, default=5, help="páginas por lado")
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos de demora por respuesta")
+    parser.add_argument("--recorded", help="JSON grabado: {\"ventas\": [[...], ...], \"compras\": [...]}")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    recorded = None
+    if args.recorded:
+        with open(args.recorded, encoding="utf-8") as f:
+            recorded = json.load(f)
+    server = FixtureServer(HallFixture(args.adverts, args.pages, recorded=recorded), args.latency, port=args.port)
+    print(f"Hall falso en {server.url('ventas')} y {server.url('compras')}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
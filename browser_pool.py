@@ -0,0 +1,219 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from metrics import REGISTRY
+
+# --- Configuración del Navegador ---
+# Número máximo de BrowserContext abiertos a la vez (cada uno cuesta ~50-100 MB en Chromium)
+MAX_CONTEXTS = int(os.environ.get('BROWSER_MAX_CONTEXTS', 2))
+
+LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",  # /dev/shm es muy chico en contenedores
+]
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+VIEWPORT = {"width": 1920, "height": 1080}
+STEALTH_SCRIPT = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+
+# Si Chromium no arranca, no se reintenta enseguida: la espera empieza en
+# BROWSER_LAUNCH_BACKOFF segundos y se duplica con cada fallo (hasta BROWSER_LAUNCH_BACKOFF_MAX)
+LAUNCH_BACKOFF = float(os.environ.get('BROWSER_LAUNCH_BACKOFF', 5))
+LAUNCH_BACKOFF_MAX = float(os.environ.get('BROWSER_LAUNCH_BACKOFF_MAX', 300))
+# Cada cuánto el planificador comprueba que el navegador responde (0 lo desactiva)
+HEALTH_CHECK_INTERVAL = float(os.environ.get('BROWSER_HEALTH_CHECK_INTERVAL', 300))
+HEALTH_CHECK_TIMEOUT = 10
+
+
+BROWSER_LAUNCHES = REGISTRY.counter("p2p_browser_launches_total", "Lanzamientos de Chromium")
+BROWSER_LAUNCH_FAILURES = REGISTRY.counter("p2p_browser_launch_failures_total", "Lanzamientos de Chromium fallidos")
+CONTEXT_SECONDS = REGISTRY.histogram(
+    "p2p_browser_context_seconds", "Tiempo de préstamo de un contexto (scrapeo completo de un lado)", ("start",))
+CONTEXTS_IN_USE = REGISTRY.gauge("p2p_browser_contexts_in_use", "BrowserContext abiertos ahora")
+
+
+def async_playwright():
+    # Import diferido: Playwright tarda ~60 ms en importarse y solo hace falta al lanzar
+    # Chromium, que ya ocurre en segundo plano; el servidor empieza a escuchar antes
+    from playwright.async_api import async_playwright as start_playwright
+    return start_playwright()
+
+
+class BrowserUnavailable(Exception):
+    """Chromium no arrancó hace poco y todavía no toca reintentar."""
+
+
+class ContextRejected(Exception):
+    """El navegador está sano pero `new_context` falló: las opciones (p. ej. un storage_state) no sirven."""
+
+
+def _percentile(values, pct):
+    """Percentil por rango más cercano (suficiente para unas decenas de muestras)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index], 3)
+
+
+class BrowserManager:
+    """
+    Chromium de larga duración: se lanza una sola vez por proceso (o de nuevo si
+    se cae) y entrega BrowserContext nuevos, limitados a `max_contexts` a la vez.
+
+    Debe usarse siempre desde el mismo event loop (los objetos de Playwright
+    están atados al loop que los creó).
+    """
+
+    def __init__(self, max_contexts=MAX_CONTEXTS, history=50):
+        self.max_contexts = max_contexts
+        self.launches = 0
+        self.launch_failures = 0        # lanzamientos fallidos seguidos
+        self._retry_launch_at = 0.0     # time.monotonic() desde el que se puede volver a lanzar
+        self._pw = None
+        self._browser = None
+        self._launch_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_contexts)
+        self._in_use = 0
+        # Latencias de cada préstamo de contexto, separadas por arranque en frío / en caliente
+        self._latencies = {"cold": deque(maxlen=history), "warm": deque(maxlen=history)}
+
+    # --- Ciclo de vida del navegador ---
+    def is_healthy(self):
+        return self._browser is not None and self._browser.is_connected()
+
+    async def get_browser(self):
+        """Devuelve el navegador vivo, relanzándolo si no existe o se desconectó."""
+        async with self._launch_lock:
+            if not self.is_healthy():
+                await self._launch()
+            return self._browser
+
+    async def _launch(self):
+        wait = self._retry_launch_at - time.monotonic()
+        if wait > 0:
+            raise BrowserUnavailable(f"Chromium no arrancó ({self.launch_failures} intentos); reintento en {wait:.0f} s")
+        await self._shutdown()
+        try:
+            self._pw = await async_playwright().start()
+            self._browser = await self._pw.chromium.launch(headless=True, args=LAUNCH_ARGS)
+        except Exception:
+            await self._shutdown()
+            self.launch_failures += 1
+            self._retry_launch_at = time.monotonic() + min(
+                LAUNCH_BACKOFF_MAX, LAUNCH_BACKOFF * 2 ** (self.launch_failures - 1))
+            BROWSER_LAUNCH_FAILURES.inc()
+            raise
+        self._browser.on("disconnected", self._on_disconnected)
+        self.launches += 1
+        self.launch_failures = 0
+        self._retry_launch_at = 0.0
+        BROWSER_LAUNCHES.inc()
+
+    def _on_disconnected(self, browser):
+        # Chromium se cayó (OOM, crash...). El próximo préstamo lo relanza.
+        if browser is self._browser:
+            print("El navegador se desconectó; se relanzará en el próximo scrapeo.")
+            self._browser = None
+
+    async def _shutdown(self):
+        browser, pw = self._browser, self._pw
+        self._browser, self._pw = None, None
+        if browser is not None:
+            try: await browser.close()
+            except Exception: pass
+        if pw is not None:
+            try: await pw.stop()
+            except Exception: pass
+
+    async def health_check(self, timeout=HEALTH_CHECK_TIMEOUT):
+        """
+        Comprueba que el navegador lanzado responde (un Chromium colgado puede seguir
+        "conectado"); si no, lo relanza. No lanza uno nuevo si no hay ninguno, y no
+        toca uno con contextos en uso: relanzarlo cortaría esos scrapeos.
+        Devuelve True si el navegador quedó sano (o no hacía falta comprobarlo).
+        """
+        browser = self._browser
+        if browser is None or self._in_use:
+            return True
+        try:
+            context = await asyncio.wait_for(browser.new_context(), timeout=timeout)
+            await context.close()
+            return True
+        except Exception as e:
+            if self._in_use:
+                return True
+            print(f"Chequeo de salud del navegador fallido, relanzando: {e!r}")
+            try:
+                async with self._launch_lock:
+                    await self._launch()
+            except Exception as launch_error:
+                print(f"No se pudo relanzar el navegador: {launch_error}")
+            return self.is_healthy()
+
+    async def close(self):
+        async with self._launch_lock:
+            await self._shutdown()
+
+    # --- Préstamo de contextos ---
+    @asynccontextmanager
+    async def context(self, **options):
+        """
+        Entrega un BrowserContext nuevo con la configuración anti-detección.
+        Espera si ya hay `max_contexts` en uso; el contexto se cierra al salir.
+        """
+        async with self._slots:
+            started = time.monotonic()
+            launches_before = self.launches
+            browser = await self.get_browser()
+            try:
+                context = await self._new_context(browser, options)
+            except Exception as e:
+                # Un error de opciones (p. ej. un storage_state inválido) con el navegador sano
+                # se propaga: relanzar cortaría los scrapeos de los otros contextos en curso
+                if self.is_healthy():
+                    raise ContextRejected(str(e)) from e
+                # Se cayó entre get_browser y new_context: un reintento con uno nuevo
+                context = await self._new_context(await self.get_browser(), options)
+
+            self._in_use += 1
+            CONTEXTS_IN_USE.set(self._in_use)
+            try:
+                yield context
+            finally:
+                self._in_use -= 1
+                CONTEXTS_IN_USE.set(self._in_use)
+                try: await context.close()
+                except Exception: pass
+                kind = "cold" if self.launches != launches_before else "warm"
+                self._latencies[kind].append(time.monotonic() - started)
+                CONTEXT_SECONDS.observe(time.monotonic() - started, start=kind)
+
+    async def _new_context(self, browser, options):
+        options = {"viewport": VIEWPORT, "user_agent": USER_AGENT, **options}
+        context = await browser.new_context(**options)
+        await context.add_init_script(STEALTH_SCRIPT)
+        return context
+
+    # --- Estadísticas ---
+    def stats(self):
+        """Resumen de lanzamientos y latencia de scrapeo en frío / en caliente."""
+        result = {"launches": self.launches, "launch_failures": self.launch_failures,
+                  "contexts_in_use": self._in_use, "healthy": self.is_healthy()}
+        for kind, values in self._latencies.items():
+            result[kind] = {
+                "count": len(values),
+                "avg_s": round(sum(values) / len(values), 3) if values else None,
+                "p50_s": _percentile(values, 50),
+                "p95_s": _percentile(values, 95),
+                "last_s": round(values[-1], 3) if values else None,
+            }
+        return result
+
+    def report(self):
+        """Texto de una línea con la comparación frío vs caliente."""
+        s = self.stats()
+        fmt = lambda d: f"p50 {d['p50_s']:.1f} s / p95 {d['p95_s']:.1f} s (n={d['count']})" if d["count"] else "-"
+        return f"Navegador: lanzamientos={s['launches']} | frío {fmt(s['cold'])} | caliente {fmt(s['warm'])}"
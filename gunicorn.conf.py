@@ -0,0 +1,41 @@
+import os
+
+# ----------------- SERVIDOR DE PRODUCCIÓN (gunicorn) -----------------
+# Un solo proceso: el planificador, el navegador y los snapshots viven en su
+# memoria (con más workers cada uno scrapearía por su cuenta). La concurrencia
+# la dan los hilos: las vistas solo leen snapshots ya renderizados y cacheados,
+# y cada conexión SSE abierta ocupa un hilo, así que hay muchos. Las conexiones SSE
+# tienen tope (SSE_MAX_CONNECTIONS, por defecto la mitad de los hilos): por encima,
+# live.js consulta /api/levels, y páginas, API y /healthz nunca se quedan sin hilo.
+# Playwright corre aparte, en el event loop del hilo del planificador.
+#
+#   gunicorn -c gunicorn.conf.py app:app
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = 1
+worker_class = "gthread"
+threads = int(os.environ.get('WEB_THREADS', 256))
+# Las conexiones keep-alive esperan en el poller del worker, no en un hilo
+keepalive = 5
+timeout = 60
+graceful_timeout = 20
+accesslog = "-" if os.environ.get('ACCESS_LOG') else None
+
+
+def post_worker_init(worker):
+    # El primer scrapeo arranca con el worker, no con la primera visita
+    from app import scheduler
+    scheduler.start()
+
+
+def worker_exit(server, worker):
+    # Cierra Chromium desde su propio event loop para no dejar procesos colgados
+    from app import scheduler
+    from scraper import default_browser_manager
+    try:
+        scheduler.run_coroutine(default_browser_manager.close(), timeout=10)
+    except Exception as e:
+        print(f"Error al cerrar el navegador: {e}")
+    # El hilo escritor del último snapshot es daemon: lo pendiente se guarda ahora
+    from app import snapshot_file
+    snapshot_file.flush()
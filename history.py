@@ -0,0 +1,215 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from analytics import summarize
+
+# ----------------- HISTORIAL DE SNAPSHOTS -----------------
+# Cada snapshot publicado se guarda en SQLite (modo WAL) como una fila de resumen
+# (mejores precios, spread, profundidad) más el libro agregado por precio comprimido.
+# Las escrituras van por una cola a un hilo propio, en lotes: publicar nunca espera al disco.
+#
+# Retención:
+#   - filas de 1 snapshot ("raw") durante HISTORY_RAW_DAYS
+#   - el libro comprimido solo durante HISTORY_BOOK_DAYS (después queda solo el resumen)
+#   - promedios por hora durante HISTORY_HOURLY_DAYS
+HISTORY_DB = os.environ.get('HISTORY_DB', 'data/history.sqlite3')
+HISTORY_RAW_DAYS = float(os.environ.get('HISTORY_RAW_DAYS', 35))
+HISTORY_BOOK_DAYS = float(os.environ.get('HISTORY_BOOK_DAYS', 7))
+HISTORY_HOURLY_DAYS = float(os.environ.get('HISTORY_HOURLY_DAYS', 365))
+
+RAW = 0          # Resolución de las filas de snapshot
+HOURLY = 3600    # Resolución de las filas agregadas
+
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 2.0        # segundos máximos que una fila espera en la cola
+MAINTENANCE_INTERVAL = 3600
+
+SUMMARY_COLUMNS = ("best_bid", "best_ask", "spread", "depth_bid", "depth_ask", "adverts_bid", "adverts_ask")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    market      TEXT    NOT NULL,
+    resolution  INTEGER NOT NULL,
+    ts          INTEGER NOT NULL,   -- segundos unix
+    version     INTEGER,
+    best_bid    REAL,
+    best_ask    REAL,
+    spread      REAL,
+    depth_bid   REAL,
+    depth_ask   REAL,
+    adverts_bid INTEGER,
+    adverts_ask INTEGER,
+    book        BLOB,               -- zlib(json) de los niveles por precio, solo en filas raw recientes
+    PRIMARY KEY (market, resolution, ts)
+) WITHOUT ROWID;
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class HistoryStore:
+    """
+    Historial de snapshots por mercado.
+
+    `record()` se puede llamar desde cualquier hilo y no bloquea; las consultas
+    abren una conexión de lectura por hilo (en WAL los lectores no esperan al escritor).
+    """
+
+    def __init__(self, path=HISTORY_DB, raw_days=HISTORY_RAW_DAYS, book_days=HISTORY_BOOK_DAYS,
+                 hourly_days=HISTORY_HOURLY_DAYS):
+        self.path = path
+        self.raw_days = raw_days
+        self.book_days = book_days
+        self.hourly_days = hourly_days
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=10000)
+        self._local = threading.local()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _connect(path) as conn:
+            conn.executescript(SCHEMA)
+
+    # --- Escritura ---
+    def start(self):
+        """Arranca el hilo escritor (idempotente)."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._write_forever, name="p2p-history", daemon=True)
+            self._thread.start()
+
+    def record(self, snapshot):
+        """Encola `snapshot` para guardarlo. Nunca bloquea: si la cola está llena se descarta."""
+        self.start()
+        try:
+            self._queue.put_nowait(snapshot)
+        except queue.Full:
+            self.dropped += 1
+
+    def _row(self, snapshot):
+        summary = summarize(snapshot)
+        book = zlib.compress(json.dumps(summary["levels"], separators=(",", ":")).encode())
+        return (snapshot.market, RAW, int(snapshot.created_at), snapshot.version,
+                *(summary[c] for c in SUMMARY_COLUMNS), book)
+
+    def _write_forever(self):
+        conn = _connect(self.path)
+        last_maintenance = 0.0
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=FLUSH_INTERVAL))
+                while len(batch) < BATCH_SIZE:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            [self._row(snapshot) for snapshot in batch],
+                        )
+                except Exception as e:
+                    print(f"Error al guardar el historial ({len(batch)} snapshots): {e}")
+
+            if time.time() - last_maintenance > MAINTENANCE_INTERVAL:
+                last_maintenance = time.time()
+                try:
+                    self.maintain(conn)
+                except Exception as e:
+                    print(f"Error en el mantenimiento del historial: {e}")
+
+    def maintain(self, conn=None, now=None):
+        """Agrega por hora las horas ya cerradas y aplica la retención."""
+        conn = conn or self._reader()
+        now = now if now is not None else time.time()
+        current_hour = int(now) // HOURLY * HOURLY
+        averages = ", ".join(f"AVG({c})" for c in SUMMARY_COLUMNS)
+        with conn:
+            # Solo se recalculan las horas posteriores a la última ya agregada de cada mercado
+            conn.execute(
+                f"""
+                INSERT OR REPLACE INTO snapshots
+                SELECT r.market, {HOURLY}, r.ts / {HOURLY} * {HOURLY}, MAX(r.version), {averages}, NULL
+                FROM snapshots r
+                WHERE r.resolution = {RAW} AND r.ts < ?
+                  AND r.ts >= COALESCE((SELECT MAX(h.ts) FROM snapshots h
+                                        WHERE h.market = r.market AND h.resolution = {HOURLY}), 0)
+                GROUP BY r.market, r.ts / {HOURLY}
+                """,
+                (current_hour,),
+            )
+            conn.execute("UPDATE snapshots SET book = NULL WHERE resolution = ? AND ts < ? AND book IS NOT NULL",
+                         (RAW, now - self.book_days * 86400))
+            conn.execute("DELETE FROM snapshots WHERE resolution = ? AND ts < ?", (RAW, now - self.raw_days * 86400))
+            conn.execute("DELETE FROM snapshots WHERE resolution = ? AND ts < ?",
+                         (HOURLY, now - self.hourly_days * 86400))
+
+    # --- Consultas ---
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def _resolution_for(self, start):
+        return RAW if start >= time.time() - self.raw_days * 86400 else HOURLY
+
+    def query(self, market, start, end, columns=SUMMARY_COLUMNS, resolution=None):
+        """
+        Filas de `market` entre `start` y `end` (segundos unix), ordenadas por tiempo.
+        Sin `resolution` se usan las filas raw si el rango entra en su retención y las horarias si no.
+        """
+        columns = [c for c in columns if c in SUMMARY_COLUMNS]
+        resolution = self._resolution_for(start) if resolution is None else resolution
+        cursor = self._reader().execute(
+            f"SELECT ts, {', '.join(columns)} FROM snapshots "
+            f"WHERE market = ? AND resolution = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (market, resolution, int(start), int(end)),
+        )
+        names = ["ts", *columns]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def best_prices(self, market, start, end):
+        return self.query(market, start, end, ("best_bid", "best_ask"))
+
+    def spread(self, market, start, end):
+        return self.query(market, start, end, ("best_bid", "best_ask", "spread"))
+
+    def depth(self, market, start, end):
+        return self.query(market, start, end, ("depth_bid", "depth_ask", "adverts_bid", "adverts_ask"))
+
+    def at(self, market, ts):
+        """El último resumen guardado en o antes de `ts` (p. ej. "el mejor precio hace 3 horas")."""
+        cursor = self._reader().execute(
+            f"SELECT ts, {', '.join(SUMMARY_COLUMNS)} FROM snapshots "
+            f"WHERE market = ? AND resolution = ? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+            (market, self._resolution_for(ts), int(ts)),
+        )
+        row = cursor.fetchone()
+        return dict(zip(["ts", *SUMMARY_COLUMNS], row)) if row else None
+
+    def book(self, market, ts):
+        """Libro agregado por precio del snapshot raw guardado en o antes de `ts` (si aún se conserva)."""
+        cursor = self._reader().execute(
+            "SELECT ts, book FROM snapshots WHERE market = ? AND resolution = ? AND ts <= ? "
+            "AND book IS NOT NULL ORDER BY ts DESC LIMIT 1",
+            (market, RAW, int(ts)),
+        )
+        row = cursor.fetchone()
+        return {"ts": row[0], **json.loads(zlib.decompress(row[1]))} if row else None
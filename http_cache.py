@@ -0,0 +1,117 @@
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se sirve gzip
+    brotli = None
+
+# ----------------- RESPUESTAS CACHEADAS POR SNAPSHOT -----------------
+# Cada cuerpo se serializa y comprime una sola vez por versión de snapshot y se
+# guarda aquí; servirlo de nuevo es una búsqueda en un diccionario. La ETag sale
+# de la versión del snapshot (más un id de arranque, porque las versiones se
+# reinician con el proceso), así que un cliente con la versión al día recibe un
+# 304 sin cuerpo.
+
+BOOT_ID = os.urandom(4).hex()
+CACHE_SIZE = 256
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def snapshot_etag(snapshot, name):
+    """ETag (sin comillas) de la representación `name` de `snapshot`."""
+    return f"{name}-{BOOT_ID}-{snapshot.version}"
+
+
+def _negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return "identity"
+
+
+def _compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+class EncodedCache:
+    """LRU de cuerpos ya serializados, por clave y codificación."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, encoding, build):
+        """
+        Devuelve los bytes de `key` en `encoding`. `build()` produce el cuerpo sin
+        comprimir y solo se llama la primera vez.
+        """
+        with self._lock:
+            variants = self._entries.get(key)
+            if variants is not None:
+                self._entries.move_to_end(key)
+                if encoding in variants:
+                    self.hits += 1
+                    return variants[encoding]
+
+        self.misses += 1
+        identity = variants["identity"] if variants and "identity" in variants else build()
+        body = _compress(identity, encoding)
+        with self._lock:
+            variants = self._entries.setdefault(key, {})
+            variants["identity"] = identity
+            variants[encoding] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return body
+
+
+encoded_cache = EncodedCache()
+
+
+def cached_response(etag, build, mimetype, cache=encoded_cache):
+    """
+    Respuesta HTTP con ETag fuerte, 304 si el cliente ya la tiene y el cuerpo
+    comprimido según Accept-Encoding. `build()` devuelve los bytes sin comprimir.
+    """
+    encoding = _negotiate_encoding()
+    # La ETag fuerte cambia con la codificación: son bytes distintos
+    tag = f"{etag}-{encoding}" if encoding != "identity" else etag
+
+    if request.if_none_match.contains_weak(tag):
+        response = Response(status=304)
+    else:
+        body = cache.get(etag, encoding, build)
+        response = Response(body, mimetype=mimetype)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(tag)
+    response.headers["Vary"] = "Accept-Encoding"
+    # Los clientes pueden guardar la respuesta pero deben revalidarla (barato: 304)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def cached_json(etag, build_payload, cache=encoded_cache):
+    """Como `cached_response`, para un payload JSON (`build_payload()` devuelve un dict)."""
+    return cached_response(
+        etag,
+        lambda: json.dumps(build_payload(), ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        "application/json",
+        cache=cache,
+    )
@@ -0,0 +1,129 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from scraper import ScrapeFailed, scrape_bitget_p2p
+
+# ----------------- REGISTRO DE MERCADOS -----------------
+# Un mercado es un par (activo, fiat) en un exchange. Cada exchange sabe armar las
+# URLs de sus dos lados y con qué función se scrapea.
+
+
+def bitget_urls(asset, fiat):
+    """
+    URLs del hall P2P de Bitget: (ventas, compras).
+    VENTA de USDT -> la gente VENDE USDT, tu COMPRAS fiat (Offer Side en Bitget)
+    COMPRA de USDT -> la gente COMPRA USDT, tu VENDES fiat (Demand Side en Bitget)
+    """
+    query = f"paymethodIds=-1&fiatName={fiat}"
+    if asset != "USDT":
+        query += f"&coinName={asset}"
+    return (
+        f"https://www.bitget.com/p2p-trade/sell?{query}",
+        f"https://www.bitget.com/p2p-trade?{query}",
+    )
+
+
+@dataclass(frozen=True)
+class Exchange:
+    name: str
+    build_urls: object      # (asset, fiat) -> (url_ventas, url_compras)
+    scrape: object          # corrutina (url, operation_type) -> lista de registros
+    min_spacing: float      # Segundos mínimos entre el inicio de dos scrapeos del mismo exchange
+
+
+EXCHANGES = {
+    "bitget": Exchange(
+        name="bitget",
+        build_urls=bitget_urls,
+        scrape=scrape_bitget_p2p,
+        min_spacing=float(os.environ.get('BITGET_MIN_SPACING', 5)),
+    ),
+}
+
+
+@dataclass(frozen=True)
+class Market:
+    exchange: str
+    asset: str
+    fiat: str
+    interval: float = 50    # Segundos entre refrescos (REFRESH_INTERVAL si no se indica)
+    priority: int = 0       # Mayor prioridad se scrapea primero cuando no hay lugar para todos
+
+    @property
+    def key(self):
+        return f"{self.exchange}/{self.asset}/{self.fiat}"
+
+    @property
+    def title(self):
+        return f"{self.exchange.upper()} ({self.asset}/{self.fiat})"
+
+    def urls(self):
+        return EXCHANGES[self.exchange].build_urls(self.asset, self.fiat)
+
+
+DEFAULT_INTERVAL = float(os.environ.get('REFRESH_INTERVAL', 50))
+
+
+def parse_markets(spec):
+    """
+    Lee la lista de mercados de un texto tipo
+    "bitget:USDT:BOB:50:10,bitget:USDT:ARS:120" (exchange:activo:fiat[:intervalo[:prioridad]]).
+    """
+    markets = []
+    for item in spec.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if len(parts) < 3 or not all(parts[:3]):
+            continue
+        exchange, asset, fiat = parts[0].lower(), parts[1].upper(), parts[2].upper()
+        if exchange not in EXCHANGES:
+            print(f"Exchange desconocido en P2P_MARKETS, se ignora: {exchange}")
+            continue
+        interval = float(parts[3]) if len(parts) > 3 and parts[3] else DEFAULT_INTERVAL
+        priority = int(parts[4]) if len(parts) > 4 and parts[4] else 0
+        markets.append(Market(exchange, asset, fiat, interval, priority))
+    return markets
+
+
+# El primero es el mercado principal (el de la ruta "/")
+DEFAULT_MARKETS_SPEC = "bitget:USDT:BOB::10,bitget:USDT:ARS:120,bitget:USDT:PEN:120,bitget:USDT:VES:120"
+MARKETS = parse_markets(os.environ.get('P2P_MARKETS', DEFAULT_MARKETS_SPEC))
+MARKETS_BY_KEY = {market.key: market for market in MARKETS}
+DEFAULT_MARKET = MARKETS[0]
+
+
+def get_market(exchange, asset, fiat):
+    return MARKETS_BY_KEY.get(f"{exchange.lower()}/{asset.upper()}/{fiat.upper()}")
+
+
+async def fetch_market(market):
+    """
+    Scrapea ambos lados de `market` en paralelo. Devuelve `(data_ventas, data_compras)`
+    (ScrapeResult: listas que además dicen si el scrapeo fue completo o parcial).
+
+    Si un lado falló sin traer ningún anuncio lanza ScrapeFailed: se sigue
+    mostrando el último snapshot bueno en lugar de publicar un libro vacío.
+    """
+    exchange = EXCHANGES[market.exchange]
+    url_ventas, url_compras = market.urls()
+
+    # Lanzar ambas tareas asíncronamente
+    ventas_task = exchange.scrape(url_ventas, "ventas")
+    compras_task = exchange.scrape(url_compras, "compras")
+
+    # Esperar a que ambas tareas finalicen
+    results = await asyncio.gather(ventas_task, compras_task)
+
+    # IMPORTANTE: se mantiene el intercambio original de resultados:
+    # data_ventas es lo listado en la URL de compras (la gente VENDE USDT y se
+    # muestra como 'Ofertas de Compra', precio bajo primero) y viceversa.
+    data_ventas = results[1]  # Venta de USDT (Side 1)
+    data_compras = results[0] # Compra de USDT (Side 0)
+
+    failed = [
+        f"{side}: {data.error or data.outcome}"
+        for side, data in (("ventas", data_ventas), ("compras", data_compras))
+        if not data and getattr(data, "outcome", "ok") != "ok"
+    ]
+    if failed:
+        raise ScrapeFailed("; ".join(failed))
+    return data_ventas, data_compras
@@ -0,0 +1,370 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:  # psutil es opcional: sin él se lee /proc (solo Linux)
+    psutil = None
+
+# ----------------- MÉTRICAS (formato de texto de Prometheus) -----------------
+# Registro mínimo de contadores, gauges e histogramas, sin dependencias. Los
+# módulos declaran sus métricas aquí y `/metrics` (app.py) sirve `REGISTRY.render()`.
+#
+# Cada scrapeo lleva además un `ScrapeTrace` con la duración de cada fase
+# (goto, popups, espera de la lista, paginación, extracción...). Con
+# SCRAPE_TRACE_LOG se escribe cada traza como una línea JSON ("-" = stdout).
+
+SCRAPE_TRACE_LOG = os.environ.get('SCRAPE_TRACE_LOG', '')
+
+# Segundos: desde una extracción (decenas de ms) hasta el presupuesto completo del scrapeo
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 45, 90)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: se esperaban las etiquetas {self.labelnames}, no {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, key, value) for key, value in items]
+
+    def render(self):
+        lines = self.header()
+        for name, key, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Contador monótono, opcionalmente con etiquetas."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def values(self):
+        """{valores de etiquetas: cuenta} (para informes en texto)."""
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja (memoria, elementos en cola...)."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo con `buckets` fijos (límites superiores, en orden)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = self.header()
+        label_names = self.labelnames + ("le",)
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(label_names, key + (_format_value(bound),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """Conjunto de métricas más funciones que actualizan gauges justo antes de exportar."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-declarar (p. ej. al recargar un módulo) devuelve la misma métrica
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, fn):
+        """Registra `fn()` para que se llame en cada `render()` (sirve como decorador)."""
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        """Todas las métricas en el formato de texto de Prometheus (0.0.4)."""
+        with self._lock:
+            collectors, metrics = list(self._collectors), list(self._metrics.values())
+        for fn in collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"Error al recolectar métricas ({getattr(fn, '__name__', fn)}): {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SCRAPE_PHASE_SECONDS = REGISTRY.histogram(
+    "p2p_scrape_phase_seconds", "Duración de cada fase de un scrapeo", ("side", "phase"))
+SCRAPE_SECONDS = REGISTRY.histogram(
+    "p2p_scrape_seconds", "Duración total de un scrapeo de un lado", ("side", "outcome"))
+ADVERTS_EXTRACTED = REGISTRY.counter(
+    "p2p_adverts_extracted_total", "Anuncios extraídos (tras quitar repetidos)", ("side", "source"))
+PAGES_SCRAPED = REGISTRY.counter(
+    "p2p_pages_scraped_total", "Páginas del hall leídas", ("side", "source"))
+PAGES_SKIPPED = REGISTRY.counter(
+    "p2p_pages_skipped_total", "Páginas no leídas (no activadas, no llegadas, sin paginador)", ("side", "reason"))
+FALLBACKS = REGISTRY.counter(
+    "p2p_fallbacks_total", "Caminos alternativos tomados (red -> DOM, bloque -> por tarjeta, paralelo -> clic)",
+    ("side", "path"))
+
+
+# --- Trazas por scrapeo ---
+class ScrapeTrace:
+    """
+    Fases de un scrapeo con su duración. Cada `span()` se observa también en
+    `p2p_scrape_phase_seconds`; `finish()` cierra la traza y la escribe en
+    SCRAPE_TRACE_LOG si está configurado.
+    """
+
+    def __init__(self, side, url=None):
+        self.side = side
+        self.url = url
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self.spans = []
+        self.counts = {}
+
+    @contextmanager
+    def span(self, phase):
+        """Mide el bloque como la fase `phase` (sirve igual dentro de código asíncrono)."""
+        start = time.monotonic()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            self.record(phase, start, ok)
+
+    def record(self, phase, start, ok=True):
+        """Registra la fase `phase` que empezó en `start` (time.monotonic()) y termina ahora."""
+        duration = time.monotonic() - start
+        SCRAPE_PHASE_SECONDS.observe(duration, side=self.side, phase=phase)
+        self.spans.append({
+            "phase": phase,
+            "start_s": round(start - self._started, 4),
+            "duration_s": round(duration, 4),
+            "ok": ok,
+        })
+
+    def count(self, name, amount=1):
+        """Contador propio de la traza (p. ej. páginas saltadas), además de la métrica global."""
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def page_read(self, source):
+        PAGES_SCRAPED.inc(side=self.side, source=source)
+        self.count(f"pages_{source}")
+
+    def page_skipped(self, reason):
+        PAGES_SKIPPED.inc(side=self.side, reason=reason)
+        self.count(f"pages_skipped_{reason}")
+
+    def fallback(self, path):
+        FALLBACKS.inc(side=self.side, path=path)
+        self.count(f"fallback_{path}")
+
+    def finish(self, outcome, adverts, source):
+        duration = time.monotonic() - self._started
+        SCRAPE_SECONDS.observe(duration, side=self.side, outcome=outcome)
+        if source:
+            ADVERTS_EXTRACTED.inc(adverts, side=self.side, source=source)
+        if SCRAPE_TRACE_LOG:
+            self._write({
+                "ts": round(self.started_at, 3),
+                "side": self.side,
+                "url": self.url,
+                "outcome": outcome,
+                "source": source,
+                "adverts": adverts,
+                "duration_s": round(duration, 4),
+                "spans": self.spans,
+                "counts": self.counts,
+            })
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        if SCRAPE_TRACE_LOG == "-":
+            print(line)
+            return
+        try:
+            with open(SCRAPE_TRACE_LOG, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"No se pudo escribir la traza en {SCRAPE_TRACE_LOG}: {e}")
+
+
+# --- Memoria y CPU del navegador ---
+# Chromium y el driver de Playwright son procesos hijos de este: se suman todos
+# los descendientes, separados en "chromium" y "driver" por nombre.
+BROWSER_RSS = REGISTRY.gauge("p2p_browser_resident_memory_bytes", "Memoria residente de los procesos del navegador",
+                             ("process",))
+BROWSER_CPU = REGISTRY.gauge("p2p_browser_cpu_seconds", "CPU acumulada (usuario + sistema) de los procesos del navegador",
+                             ("process",))
+BROWSER_PROCESSES = REGISTRY.gauge("p2p_browser_processes", "Procesos del navegador vivos", ("process",))
+PROCESS_RSS = REGISTRY.gauge("p2p_process_resident_memory_bytes", "Memoria residente del proceso del servidor")
+PROCESS_CPU = REGISTRY.gauge("p2p_process_cpu_seconds", "CPU acumulada (usuario + sistema) del proceso del servidor")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _process_kind(name):
+    return "chromium" if "chrom" in name.lower() or "headless" in name.lower() else "driver"
+
+
+def _usage_psutil():
+    me = psutil.Process()
+    own = me.memory_info().rss, sum(me.cpu_times()[:2])
+    children = []
+    for child in me.children(recursive=True):
+        try:
+            with child.oneshot():
+                children.append((child.name(), child.memory_info().rss, sum(child.cpu_times()[:2])))
+        except psutil.Error:
+            continue
+    return own, children
+
+
+def _read_proc_stat(pid):
+    with open(f"/proc/{pid}/stat", "rb") as f:
+        raw = f.read().decode(errors="replace")
+    # El nombre va entre paréntesis y puede tener espacios: se separa por el último ')'
+    name = raw[raw.index("(") + 1:raw.rindex(")")]
+    fields = raw[raw.rindex(")") + 2:].split()
+    ppid = int(fields[1])
+    cpu = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    rss = int(fields[21]) * _PAGE_SIZE
+    return name, ppid, rss, cpu
+
+
+def _usage_proc():
+    stats = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                stats[int(entry)] = _read_proc_stat(entry)
+            except (OSError, ValueError, IndexError):
+                continue
+    me = os.getpid()
+    own = stats[me][2:] if me in stats else (0, 0.0)
+    children_of = {}
+    for pid, (_, ppid, _, _) in stats.items():
+        children_of.setdefault(ppid, []).append(pid)
+    children, pending = [], list(children_of.get(me, ()))
+    while pending:
+        pid = pending.pop()
+        name, _, rss, cpu = stats[pid]
+        children.append((name, rss, cpu))
+        pending.extend(children_of.get(pid, ()))
+    return own, children
+
+
+@REGISTRY.collector
+def collect_process_usage():
+    if psutil is not None:
+        own, children = _usage_psutil()
+    elif os.path.isdir("/proc"):
+        own, children = _usage_proc()
+    else:
+        return
+    PROCESS_RSS.set(own[0])
+    PROCESS_CPU.set(round(own[1], 3))
+    totals = {kind: [0, 0, 0.0] for kind in ("chromium", "driver")}
+    for name, rss, cpu in children:
+        total = totals[_process_kind(name)]
+        total[0] += 1
+        total[1] += rss
+        total[2] += cpu
+    for kind, (count, rss, cpu) in totals.items():
+        BROWSER_PROCESSES.set(count, process=kind)
+        BROWSER_RSS.set(rss, process=kind)
+        BROWSER_CPU.set(round(cpu, 3), process=kind)
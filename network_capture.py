@@ -0,0 +1,211 @@
+import asyncio
+import json
+import os
+import re
+import time
+from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+
+# --- Captura de las respuestas XHR del hall P2P ---
+# El hall de Bitget se llena con llamadas XHR que devuelven la lista de anuncios en JSON.
+# Leemos esas respuestas directamente en lugar de esperar a que se rendericen.
+# Solo el último tramo de la ruta y con "adv"/"advert" como palabra: otras listas del hall
+# (/p2p/pub/tradeList, /p2p/loadPaymentList...) no deben confundirse con la de anuncios
+ADV_LIST_URL_PATTERN = re.compile(
+    os.environ.get('BITGET_ADV_LIST_PATTERN', r"/p2p/(?:[^?#]*/)?(?:query)?adv(?:ert)?s?[-_]?list(?:[/?#]|$)"),
+    re.IGNORECASE,
+)
+
+# Nombres de campo aceptados (el primero presente gana)
+LIST_KEYS = ("dataList", "advList", "list", "items", "records", "rows")
+MERCHANT_KEYS = ("nickName", "nickname", "userName", "merchantName", "name")
+PRICE_KEYS = ("price", "advPrice", "unitPrice")
+AMOUNT_KEYS = ("lastAmount", "surplusAmount", "remainAmount", "availableAmount", "amount", "quantity")
+PAGE_KEYS = ("pageNo", "pageNum", "page", "pageIndex", "current", "currentPage")
+
+
+def _first(item, keys):
+    for key in keys:
+        if item.get(key) not in (None, ""):
+            return item[key]
+    return None
+
+
+def _to_float(value):
+    try:
+        return float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_advert_list(value):
+    """Una lista de anuncios: todos los elementos son objetos con precio (vacía = fin del libro)."""
+    return isinstance(value, list) and all(
+        isinstance(item, dict) and _first(item, PRICE_KEYS) is not None for item in value)
+
+
+def find_advert_list(payload):
+    """Busca (recursivamente) la lista de anuncios dentro del JSON de respuesta."""
+    if isinstance(payload, dict):
+        for key in LIST_KEYS:
+            value = payload.get(key)
+            if _is_advert_list(value):
+                return value
+        for value in payload.values():
+            found = find_advert_list(value)
+            if found is not None:
+                return found
+    elif isinstance(payload, list) and payload and _is_advert_list(payload):
+        return payload
+    return None
+
+
+def parse_advert_payload(payload, operation_type, page_num):
+    """
+    Convierte el JSON de la lista de anuncios en los mismos registros del
+    scrapeo por DOM. Devuelve None si el JSON no contiene una lista de anuncios.
+    """
+    adverts = find_advert_list(payload)
+    if adverts is None:
+        return None
+    records = []
+    for item in adverts:
+        merchant = _first(item, MERCHANT_KEYS)
+        records.append({
+            "tipo": operation_type,
+            "pagina": page_num,
+            "merchant": str(merchant).strip() if merchant is not None else "N/A",
+            "precio_bob": _to_float(_first(item, PRICE_KEYS)),
+            "monto_usdt": _to_float(_first(item, AMOUNT_KEYS)),
+        })
+    return records
+
+
+def _page_param(request):
+    """
+    Dónde va el número de página en la petición de lista.
+    Devuelve `(lugar, clave, valor)` con lugar "body" o "query", o None si no se encuentra.
+    """
+    try:
+        body = request.post_data_json
+    except Exception:
+        body = None
+    if isinstance(body, dict):
+        for key in PAGE_KEYS:
+            if body.get(key) not in (None, ""):
+                try: return "body", key, int(body[key])
+                except (TypeError, ValueError): pass
+    query = parse_qs(urlparse(request.url).query)
+    for key in PAGE_KEYS:
+        if key in query:
+            try: return "query", key, int(query[key][0])
+            except (TypeError, ValueError): pass
+    return None
+
+
+def _page_number(request):
+    """Número de página pedido, leído del cuerpo JSON o de la query string."""
+    param = _page_param(request)
+    return param[2] if param else None
+
+
+# Cabeceras que no se deben copiar al repetir la petición (las pone el cliente HTTP)
+_SKIP_HEADERS = {"content-length", "host", "connection", "accept-encoding", "cookie"}
+
+
+def build_page_request(request, page_num):
+    """
+    Copia la petición de lista capturada cambiando solo el número de página.
+    Devuelve `(url, method, headers, data)` o None si no se sabe dónde va la página.
+    """
+    param = _page_param(request)
+    if param is None:
+        return None
+    where, key, _ = param
+    url, data = request.url, request.post_data
+    if where == "body":
+        data = json.dumps({**request.post_data_json, key: page_num})
+    else:
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        query[key] = [str(page_num)]
+        url = urlunparse(parsed._replace(query=urlencode(query, doseq=True)))
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in _SKIP_HEADERS and not k.startswith(":")}
+    return url, request.method, headers, data
+
+
+class AdvertCapture:
+    """
+    Escucha `page.on("response")` y guarda los anuncios de cada página de la
+    lista a medida que llegan las respuestas JSON.
+    """
+
+    def __init__(self, operation_type):
+        self.operation_type = operation_type
+        self.pages = {}
+        self.first_request = None   # Petición de la página 1 (plantilla para pedir las demás)
+        self._arrived = asyncio.Event()
+
+    def attach(self, page):
+        page.on("response", self._on_response)
+
+    async def _on_response(self, response):
+        if not ADV_LIST_URL_PATTERN.search(response.url):
+            return
+        try:
+            payload = await response.json()
+        except Exception:
+            return
+        page_num = _page_number(response.request)
+        if page_num is None:
+            # Sin número de página en la petición solo puede ser la carga inicial: una
+            # respuesta repetida (reintento, autorrefresco) no se archiva como otra página
+            if 1 in self.pages:
+                return
+            page_num = 1
+        records = parse_advert_payload(payload, self.operation_type, page_num)
+        if records is None:
+            return
+        self.pages[page_num] = records
+        if page_num == 1:
+            self.first_request = response.request
+        self._arrived.set()
+
+    async def wait_for_page(self, page_num, timeout):
+        """Espera hasta `timeout` segundos a que llegue la respuesta de `page_num`. Devuelve sus registros o None."""
+        deadline = time.monotonic() + timeout
+        while page_num not in self.pages:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return None
+        return self.pages[page_num]
+
+    async def fetch_pages(self, request_context, page_nums, concurrency):
+        """
+        Pide directamente (sin tocar el paginador) las páginas `page_nums`, como
+        mucho `concurrency` a la vez, repitiendo la petición de la página 1 con
+        las cookies del contexto. Las que lleguen bien quedan en `self.pages`.
+        """
+        if self.first_request is None or build_page_request(self.first_request, 2) is None:
+            return
+        slots = asyncio.Semaphore(concurrency)
+
+        async def fetch(page_num):
+            url, method, headers, data = build_page_request(self.first_request, page_num)
+            async with slots:
+                try:
+                    response = await request_context.fetch(url, method=method, headers=headers, data=data)
+                    if not response.ok:
+                        return
+                    payload = await response.json()
+                except Exception:
+                    return
+            records = parse_advert_payload(payload, self.operation_type, page_num)
+            if records is not None:
+                self.pages[page_num] = records
+
+        await asyncio.gather(*(fetch(n) for n in page_nums))
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+# --- Esperas por condición en lugar de pausas fijas ---
+# Cada espera consume del mismo presupuesto (Deadline) del scrapeo, de modo que
+# la suma de todas nunca supera el tiempo total asignado.
+
+CARD_SELECTOR = ".hall-list-item"
+DIALOG_CLOSE_SELECTOR = ".bit-dialog__close"
+COOKIE_BUTTON_TEST_ID = "MicroCookieAcceptButton"
+
+# Firma barata de la lista: cantidad + texto de la primera y la última tarjeta
+LIST_SIGNATURE_JS = """
+() => {
+    const cards = document.querySelectorAll('.hall-list-item');
+    if (!cards.length) return null;
+    return cards.length + '|' + cards[0].innerText + '|' + cards[cards.length - 1].innerText;
+}
+"""
+
+# Verdadero cuando la lista tiene tarjetas y su firma no cambió entre dos sondeos
+# consecutivos (ya terminó de renderizar). Si se pasa `previous`, además exige
+# que la firma sea distinta a la de antes del clic en el paginador, y si se pasa
+# `activePage` que ese número esté marcado como activo.
+LIST_READY_JS = """
+([previous, activePage]) => {
+    const cards = document.querySelectorAll('.hall-list-item');
+    if (!cards.length) return false;
+    if (activePage !== null) {
+        const active = document.querySelector('.bit-pager li.number.active');
+        if (!active || active.innerText.trim() !== String(activePage)) return false;
+    }
+    const sig = cards.length + '|' + cards[0].innerText + '|' + cards[cards.length - 1].innerText;
+    if (previous !== null && sig === previous) return false;
+    const last = window.__p2pListSig;
+    window.__p2pListSig = sig;
+    return last === sig;
+}
+"""
+
+POLL_MS = 150
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el presupuesto de tiempo del scrapeo."""
+
+
+class Deadline:
+    """Presupuesto de tiempo total de un scrapeo, compartido por todas sus esperas."""
+
+    def __init__(self, budget_s):
+        self.budget_s = budget_s
+        self.started = time.monotonic()
+        self.expires = self.started + budget_s
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout_ms(self, cap_ms=None):
+        """Timeout (ms) para una espera de Playwright: lo que quede del presupuesto, como mucho `cap_ms`."""
+        remaining_ms = self.remaining() * 1000
+        if remaining_ms <= 0:
+            raise DeadlineExceeded(f"presupuesto de {self.budget_s:.0f} s agotado")
+        return remaining_ms if cap_ms is None else min(cap_ms, remaining_ms)
+
+    @asynccontextmanager
+    async def enforce(self, grace_s=0.0):
+        """
+        Corta el bloque si sigue corriendo `grace_s` segundos después de agotado el
+        presupuesto: cubre las operaciones que no aceptan timeout (evaluate, new_page,
+        lanzar Chromium...). Cancela la tarea y lo convierte en DeadlineExceeded.
+        """
+        task = asyncio.current_task()
+        fired = False
+
+        def expire():
+            nonlocal fired
+            fired = True
+            task.cancel()
+
+        handle = asyncio.get_running_loop().call_later(self.remaining() + grace_s, expire)
+        try:
+            yield
+        except asyncio.CancelledError:
+            if fired:
+                raise DeadlineExceeded(f"scrapeo cortado tras {self.elapsed():.1f} s") from None
+            raise
+        finally:
+            handle.cancel()
+
+
+async def list_signature(page):
+    return await page.evaluate(LIST_SIGNATURE_JS)
+
+
+async def wait_for_list_ready(page, deadline, cap_ms=60000):
+    """Espera a que la lista de ofertas esté visible y estable."""
+    await page.wait_for_selector(CARD_SELECTOR, state="visible", timeout=deadline.timeout_ms(cap_ms))
+    await page.wait_for_function(
+        LIST_READY_JS, arg=[None, None], polling=POLL_MS, timeout=deadline.timeout_ms(cap_ms)
+    )
+
+
+async def wait_for_page_change(page, page_num, previous_signature, deadline, cap_ms=10000):
+    """Tras un clic en el paginador: espera a que `page_num` esté activa y la lista haya cambiado y se estabilice."""
+    await page.wait_for_function(
+        LIST_READY_JS, arg=[previous_signature, page_num], polling=POLL_MS, timeout=deadline.timeout_ms(cap_ms)
+    )
+
+
+async def dismiss_popups(page):
+    """
+    Cierra el modal y el aviso de cookies solo si están visibles.
+    `is_visible()` no espera, así que si no hay popups esto cuesta un par de viajes al navegador.
+    Devuelve True si cerró algo.
+    """
+    closed = False
+    dialog_close = page.locator(DIALOG_CLOSE_SELECTOR)
+    if await dialog_close.first.is_visible():
+        try:
+            await dialog_close.first.click(timeout=2000)
+            closed = True
+        except Exception:
+            await page.keyboard.press("Escape")
+            closed = True
+
+    cookie_button = page.get_by_test_id(COOKIE_BUTTON_TEST_ID)
+    if await cookie_button.first.is_visible():
+        try:
+            await cookie_button.first.click(timeout=2000)
+            closed = True
+        except Exception:
+            pass
+    return closed
@@ -0,0 +1,118 @@
+import os
+import re
+from urllib.parse import urlparse
+
+# --- Perfil liviano para los contextos de scrapeo ---
+# Para leer la lista de precios solo hace falta el documento, sus scripts, las XHR
+# de la lista y las hojas de estilo (sin CSS no se puede saber si algo es visible).
+# Todo lo demás (imágenes, fuentes, media, analíticas, chats...) se aborta.
+#
+# RESOURCE_FILTER:
+#   "off"    -> no se filtra nada
+#   "lite"   -> (por defecto) solo pasan los tipos permitidos y se bloquean rastreadores conocidos
+#   "strict" -> además, solo pasan los hosts del sitio scrapeado y los de RESOURCE_ALLOWED_HOSTS
+RESOURCE_FILTER = os.environ.get('RESOURCE_FILTER', 'lite')
+
+ALLOWED_RESOURCE_TYPES = {"document", "script", "xhr", "fetch", "stylesheet"}
+
+# Hosts extra permitidos en modo estricto (p. ej. el CDN de scripts del sitio), separados por coma
+ALLOWED_HOSTS = [h.strip() for h in os.environ.get('RESOURCE_ALLOWED_HOSTS', '').split(',') if h.strip()]
+
+TRACKER_PATTERN = re.compile(
+    r"google-analytics|googletagmanager|doubleclick|googlesyndication|facebook|fbcdn|hotjar|"
+    r"clarity\.ms|sensorsdata|segment\.(io|com)|mixpanel|amplitude|sentry|intercom|zendesk|"
+    r"livechat|freshchat|tawk\.to|crisp\.chat|tiktok|twitter|linkedin|appsflyer|branch\.io|"
+    r"adjust\.com|bat\.bing|yandex|cloudflareinsights|newrelic|datadoghq",
+    re.IGNORECASE,
+)
+
+# Opciones de contexto del perfil liviano (se suman a las de BrowserManager)
+LIGHT_CONTEXT_OPTIONS = {
+    "viewport": {"width": 1366, "height": 768},
+    "reduced_motion": "reduce",
+    "service_workers": "block",
+}
+
+# Sin animaciones ni transiciones CSS: menos trabajo de CPU y la lista se estabiliza antes
+NO_ANIMATIONS_SCRIPT = """
+document.addEventListener('DOMContentLoaded', () => {
+    const style = document.createElement('style');
+    style.textContent = '*, *::before, *::after { animation: none !important; transition: none !important; }';
+    document.head.appendChild(style);
+});
+"""
+
+
+def _site_domain(host):
+    """Dominio registrable aproximado: los dos últimos niveles (www.bitget.com -> bitget.com)."""
+    parts = (host or "").split(".")
+    return ".".join(parts[-2:]) if len(parts) >= 2 else (host or "")
+
+
+class ResourceFilter:
+    """
+    Intercepta todas las peticiones del contexto con `context.route`, aborta las
+    que no hacen falta y cuenta peticiones y bytes transferidos.
+    """
+
+    def __init__(self, target_url, mode=None):
+        self.mode = mode or RESOURCE_FILTER
+        self.site = _site_domain(urlparse(target_url).hostname)
+        self.requests_total = 0
+        self.requests_blocked = 0
+        self.bytes_transferred = 0
+
+    def is_allowed(self, url, resource_type):
+        if self.mode == "off":
+            return True
+        if resource_type not in ALLOWED_RESOURCE_TYPES:
+            return False
+        host = urlparse(url).hostname or ""
+        if TRACKER_PATTERN.search(host):
+            return False
+        if self.mode == "strict":
+            first_party = host == self.site or host.endswith("." + self.site)
+            return first_party or any(host == h or host.endswith("." + h) for h in ALLOWED_HOSTS)
+        return True
+
+    async def install(self, context):
+        """Registra el filtro y los contadores en el contexto."""
+        context.on("request", self._on_request)
+        context.on("requestfinished", self._on_request_finished)
+        if self.mode == "off":
+            return
+        await context.add_init_script(NO_ANIMATIONS_SCRIPT)
+        await context.route("**/*", self._handle_route)
+
+    async def _handle_route(self, route):
+        request = route.request
+        if self.is_allowed(request.url, request.resource_type):
+            await route.continue_()
+        else:
+            self.requests_blocked += 1
+            await route.abort("blockedbyclient")
+
+    def _on_request(self, request):
+        self.requests_total += 1
+
+    async def _on_request_finished(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        self.bytes_transferred += (
+            sizes.get("requestHeadersSize", 0) + sizes.get("requestBodySize", 0)
+            + sizes.get("responseHeadersSize", 0) + sizes.get("responseBodySize", 0)
+        )
+
+    def context_options(self):
+        """Opciones de `browser.new_context` del perfil liviano (ninguna si el filtro está apagado)."""
+        return {} if self.mode == "off" else dict(LIGHT_CONTEXT_OPTIONS)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "requests_allowed": self.requests_total - self.requests_blocked,
+            "requests_blocked": self.requests_blocked,
+            "bytes_transferred": self.bytes_transferred,
+        }
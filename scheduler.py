@@ -0,0 +1,286 @@
+import asyncio
+import os
+import threading
+import time
+from analytics import summarize
+from metrics import REGISTRY
+
+# Mercados que se scrapean a la vez como máximo (cada uno ocupa dos contextos del navegador;
+# el tope global de contextos lo pone BrowserManager con BROWSER_MAX_CONTEXTS)
+MAX_CONCURRENT_MARKETS = int(os.environ.get('MAX_CONCURRENT_MARKETS', 1))
+
+REFRESHES = REGISTRY.counter("p2p_refresh_total", "Refrescos de mercado terminados", ("market", "result"))
+REFRESH_SECONDS = REGISTRY.histogram("p2p_refresh_seconds", "Duración de un refresco (ambos lados)", ("market",))
+BREAKER_OPEN = REGISTRY.gauge("p2p_breaker_open", "1 si el circuito del mercado está abierto (en espera)", ("market",))
+BREAKER_TRIPS = REGISTRY.counter("p2p_breaker_trips_total", "Veces que se abrió el circuito de un mercado", ("market",))
+REFRESH_INTERVAL = REGISTRY.gauge(
+    "p2p_refresh_interval_seconds", "Intervalo actual entre refrescos (cadencia adaptativa)", ("market",))
+
+# --- Cadencia Adaptativa ---
+# El intervalo de cada mercado se multiplica por un factor que:
+#   - vuelve a CADENCE_MIN_FACTOR cuando cambian el mejor precio de compra/venta o el spread,
+#   - crece x CADENCE_GROWTH por cada refresco sin cambios, hasta CADENCE_MAX_FACTOR,
+#   - se multiplica además por CADENCE_IDLE_FACTOR si nadie mira el mercado (sin conexiones
+#     en vivo ni lecturas en los últimos CADENCE_VIEWER_WINDOW segundos).
+# La lectura no empeora: `get()` sigue pidiendo un refresco si el snapshot supera dos
+# intervalos base. ADAPTIVE_CADENCE=0 vuelve al intervalo fijo.
+ADAPTIVE_CADENCE = os.environ.get('ADAPTIVE_CADENCE', '1') != '0'
+CADENCE_MIN_FACTOR = float(os.environ.get('CADENCE_MIN_FACTOR', 0.5))
+CADENCE_MAX_FACTOR = float(os.environ.get('CADENCE_MAX_FACTOR', 4))
+CADENCE_GROWTH = float(os.environ.get('CADENCE_GROWTH', 1.5))
+CADENCE_IDLE_FACTOR = float(os.environ.get('CADENCE_IDLE_FACTOR', 3))
+CADENCE_VIEWER_WINDOW = float(os.environ.get('CADENCE_VIEWER_WINDOW', 300))
+
+# --- Circuito por Mercado ---
+# Tras BREAKER_THRESHOLD refrescos fallidos seguidos el circuito se abre: el próximo
+# intento espera BREAKER_BASE_BACKOFF segundos, el doble en cada fallo siguiente
+# (hasta BREAKER_MAX_BACKOFF), y mientras tanto se ignoran los pedidos de refresco de
+# las vistas. Se sigue sirviendo el último snapshot bueno. Un refresco bueno lo cierra.
+BREAKER_THRESHOLD = int(os.environ.get('BREAKER_THRESHOLD', 3))
+BREAKER_BASE_BACKOFF = float(os.environ.get('BREAKER_BASE_BACKOFF', 30))
+BREAKER_MAX_BACKOFF = float(os.environ.get('BREAKER_MAX_BACKOFF', 900))
+
+
+class MarketState:
+    """Estado de refresco de un mercado dentro del planificador."""
+
+    def __init__(self, market):
+        self.market = market
+        self.next_due = 0.0         # time.monotonic() del próximo refresco
+        self.in_flight = False
+        self.last_error = None
+        self.last_error_at = None
+        self.factor = 1.0           # multiplicador del intervalo (cadencia adaptativa)
+        self.last_quote = None      # (mejor compra, mejor venta, spread) del último snapshot
+        self.last_viewed = 0.0      # time.monotonic() de la última lectura con `get()`
+        self.failures = 0           # refrescos fallidos seguidos
+        self.open_until = 0.0       # time.monotonic() hasta el que el circuito está abierto
+
+
+class MarketScheduler:
+    """
+    Refresca en segundo plano todos los mercados registrados y publica sus
+    snapshots en `store`. Corre en un hilo propio con un event loop de larga duración.
+
+    - Cada mercado tiene su intervalo y su prioridad; cuando hay más mercados
+      vencidos que lugares (`max_concurrency`), pasan primero los de mayor prioridad.
+    - Por exchange se respeta un espaciado mínimo entre inicios de scrapeo.
+    - Un solo scrapeo en vuelo por mercado (single-flight): las peticiones de
+      refresco que llegan mientras hay uno en curso se fusionan con él.
+    - Lectura stale-while-revalidate: `get()` devuelve el último snapshot aunque
+      esté viejo y pide un refresco en segundo plano sin esperarlo.
+    - Cadencia adaptativa: más rápido si el libro se mueve, más lento si está
+      quieto o nadie lo mira (`viewers(key)` da las conexiones en vivo).
+    - Circuito por mercado: tras varios fallos seguidos se reintenta con espera
+      exponencial en vez de relanzar el scrapeo en un bucle.
+    """
+
+    def __init__(self, store, markets, fetch, exchanges, max_concurrency=MAX_CONCURRENT_MARKETS,
+                 viewers=None, adaptive=ADAPTIVE_CADENCE, health_check=None, health_interval=0):
+        self.store = store
+        self.fetch = fetch              # corrutina (market) -> (data_ventas, data_compras)
+        self.exchanges = exchanges      # nombre -> Exchange (para el espaciado mínimo)
+        self.max_concurrency = max_concurrency
+        self.viewers = viewers
+        self.adaptive = adaptive
+        self.health_check = health_check        # corrutina () -> bool (p. ej. BrowserManager.health_check)
+        self.health_interval = health_interval
+        self.states = {market.key: MarketState(market) for market in markets}
+        self._running = 0
+        self._exchange_ready_at = {}
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._loop = None
+        self._wake = None
+
+    # --- Control del hilo ---
+    def start(self):
+        """Arranca el hilo del planificador (idempotente)."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="p2p-scheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        asyncio.run(self._schedule_forever())
+
+    async def _schedule_forever(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        if self.health_check is not None and self.health_interval > 0:
+            asyncio.ensure_future(self._check_health_forever())
+        while True:
+            self._wake.clear()
+            self._launch_due()
+            await self._sleep_until_next()
+
+    def _launch_due(self):
+        now = time.monotonic()
+        due = [s for s in self.states.values() if not s.in_flight and s.next_due <= now]
+        due.sort(key=lambda s: (-s.market.priority, s.next_due))
+        for state in due:
+            if self._running >= self.max_concurrency:
+                break
+            exchange = state.market.exchange
+            if self._exchange_ready_at.get(exchange, 0.0) > now:
+                continue
+            self._exchange_ready_at[exchange] = now + self.exchanges[exchange].min_spacing
+            state.in_flight = True
+            self._running += 1
+            asyncio.ensure_future(self._refresh(state))
+
+    async def _sleep_until_next(self):
+        now = time.monotonic()
+        wake_at = [
+            max(s.next_due, self._exchange_ready_at.get(s.market.exchange, 0.0))
+            for s in self.states.values() if not s.in_flight
+        ]
+        timeout = max(0.0, min(wake_at) - now) if wake_at and self._running < self.max_concurrency else None
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _check_health_forever(self):
+        # En el mismo loop que los scrapeos: los objetos de Playwright están atados a él
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.health_check()
+            except Exception as e:
+                print(f"Error en el chequeo de salud del navegador: {e}")
+
+    async def _refresh(self, state):
+        market = state.market
+        started = time.monotonic()
+        try:
+            data_ventas, data_compras = await self.fetch(market)
+        except Exception as e:
+            state.last_error = str(e)
+            state.last_error_at = time.time()
+            print(f"Ocurrió un error en el refresco de {market.key}: {e}")
+            REFRESHES.inc(market=market.key, result="error")
+            self._record_failure(state)
+            self.store.notify_failure(market.key)
+        else:
+            state.last_error = None
+            self._record_success(state)
+            # Un lado parcial (páginas saltadas, cortado por tiempo) se publica marcado como tal
+            complete = all(getattr(data, "complete", True) for data in (data_ventas, data_compras))
+            REFRESHES.inc(market=market.key, result="ok" if complete else "partial")
+            pages = {side: dict(getattr(data, "pages", {}))
+                     for side, data in (("ventas", data_ventas), ("compras", data_compras))}
+            snapshot = self.store.publish(market.key, data_ventas, data_compras,
+                                          duration=time.monotonic() - started, complete=complete, pages=pages)
+            self._adapt(state, snapshot)
+        finally:
+            REFRESH_SECONDS.observe(time.monotonic() - started, market=market.key)
+            state.in_flight = False
+            if state.open_until:
+                state.next_due = state.open_until
+            else:
+                state.next_due = time.monotonic() + self.interval(state)
+            self._running -= 1
+            self._wake.set()
+
+    # --- Circuito ---
+    def _record_failure(self, state):
+        state.failures += 1
+        if state.failures < BREAKER_THRESHOLD:
+            return
+        backoff = min(BREAKER_MAX_BACKOFF, BREAKER_BASE_BACKOFF * 2 ** (state.failures - BREAKER_THRESHOLD))
+        backoff = max(backoff, self.interval(state))
+        if state.failures == BREAKER_THRESHOLD:
+            BREAKER_TRIPS.inc(market=state.market.key)
+        state.open_until = time.monotonic() + backoff
+        BREAKER_OPEN.set(1, market=state.market.key)
+        print(f"Circuito de {state.market.key} abierto tras {state.failures} fallos: reintento en {backoff:.0f} s.")
+
+    def _record_success(self, state):
+        if state.open_until:
+            print(f"Circuito de {state.market.key} cerrado: el refresco volvió a funcionar.")
+        state.failures = 0
+        state.open_until = 0.0
+        BREAKER_OPEN.set(0, market=state.market.key)
+
+    def is_open(self, key):
+        """True si el circuito de `key` está esperando antes del próximo intento."""
+        state = self.states.get(key)
+        return state is not None and state.open_until > time.monotonic()
+
+    # --- Cadencia ---
+    def _adapt(self, state, snapshot):
+        """Ajusta el factor de `state` según si se movieron los mejores precios o el spread."""
+        summary = summarize(snapshot)
+        quote = (summary["best_bid"], summary["best_ask"], summary["spread"])
+        if state.last_quote is not None and quote != state.last_quote:
+            state.factor = CADENCE_MIN_FACTOR
+        elif state.last_quote is not None:
+            state.factor = min(CADENCE_MAX_FACTOR, max(1.0, state.factor * CADENCE_GROWTH))
+        state.last_quote = quote
+
+    def _watched(self, state):
+        if time.monotonic() - state.last_viewed < CADENCE_VIEWER_WINDOW:
+            return True
+        return bool(self.viewers and self.viewers(state.market.key))
+
+    def interval(self, state):
+        """Segundos hasta el próximo refresco de `state`."""
+        base = state.market.interval
+        if not self.adaptive:
+            seconds = base
+        else:
+            seconds = base * state.factor * (1 if self._watched(state) else CADENCE_IDLE_FACTOR)
+        REFRESH_INTERVAL.set(seconds, market=state.market.key)
+        return seconds
+
+    # --- Peticiones desde otros hilos ---
+    def request_refresh(self, key):
+        """Pide un refresco de `key` sin bloquear. Si ya hay uno en vuelo, la petición se fusiona con él."""
+        loop, state = self._loop, self.states.get(key)
+        if loop is None or state is None or state.in_flight or self.is_open(key):
+            return
+        loop.call_soon_threadsafe(self._expedite, state)
+
+    def _expedite(self, state):
+        if not state.in_flight and state.open_until <= time.monotonic():
+            state.next_due = 0.0
+            self._wake.set()
+
+    def run_coroutine(self, coro, timeout=None):
+        """
+        Ejecuta `coro` en el event loop del planificador desde otro hilo y espera su
+        resultado (p. ej. cerrar el navegador al apagar el worker). Los objetos de
+        Playwright solo se pueden usar desde ese loop.
+        """
+        if self._loop is None or not self._loop.is_running():
+            coro.close()
+            return None
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def last_error(self, key):
+        state = self.states.get(key)
+        return state.last_error if state else None
+
+    # --- Lectura ---
+    def get(self, key, timeout=None):
+        """
+        Devuelve el último snapshot de `key`.
+
+        En arranque en frío todas las peticiones esperan (como máximo `timeout`)
+        al mismo scrapeo en vuelo. Si el snapshot está viejo (más de dos
+        intervalos) se devuelve igual y se pide un refresco en segundo plano.
+        """
+        self.start()
+        state = self.states.get(key)
+        if state is not None:
+            # Un mercado que se vuelve a mirar recupera su cadencia en el próximo refresco
+            state.last_viewed = time.monotonic()
+        snapshot = self.store.latest(key)
+        if snapshot is None:
+            self.request_refresh(key)
+            return self.store.wait_for_first(key, timeout=timeout)
+        if snapshot.age > self.states[key].market.interval * 2:
+            self.request_refresh(key)
+        return snapshot
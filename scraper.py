@@ -0,0 +1,680 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from browser_pool import BrowserManager, ContextRejected
+from metrics import REGISTRY, ScrapeTrace
+from network_capture import AdvertCapture
+from resource_filter import ResourceFilter
+from storage_state import StorageStateStore
+from readiness import Deadline, DeadlineExceeded, dismiss_popups, list_signature, wait_for_list_ready, wait_for_page_change
+
+# --- URLs Definidas ---
+# Cambiamos los nombres para mayor claridad en el contexto P2P:
+# VENTA de USDT -> Compramos BOB (Side 1 en Bybit, Offer Side en Bitget)
+# COMPRA de USDT -> Vendemos BOB (Side 0 en Bybit, Demand Side en Bitget)
+URL_VENTAS = "https://www.bitget.com/p2p-trade/sell?paymethodIds=-1&fiatName=BOB" # La gente VENDE USDT, tu COMPRAS BOB
+URL_COMPRAS = "https://www.bitget.com/p2p-trade?paymethodIds=-1&fiatName=BOB" # La gente COMPRA USDT, tu VENDES BOB
+
+# Profundidad del libro: páginas del hall a leer por lado (en días volátiles conviene 10-20)
+MAX_PAGES = int(os.environ.get('SCRAPE_MAX_PAGES', 2))
+# Páginas 2..N pedidas en paralelo como mucho (modo red)
+PAGE_CONCURRENCY = int(os.environ.get('SCRAPE_PAGE_CONCURRENCY', 4))
+
+# Presupuesto total (segundos) de un scrapeo: todas las esperas salen de aquí
+SCRAPE_BUDGET = float(os.environ.get('SCRAPE_BUDGET', 90))
+# Margen tras agotar el presupuesto antes de cortar a la fuerza (ver Deadline.enforce)
+SCRAPE_DEADLINE_GRACE = float(os.environ.get('SCRAPE_DEADLINE_GRACE', 5))
+
+# Navegador compartido por todos los scrapeos del proceso (se lanza en el primer uso)
+default_browser_manager = BrowserManager()
+# Cookies y localStorage guardados tras cerrar los avisos (ver storage_state.py)
+default_storage_states = StorageStateStore()
+
+# --- Extracción de Tarjetas ---
+CARD_SELECTOR = ".hall-list-item"
+NAME_SELECTOR = ".list-item__nickname"
+PRICE_SELECTOR = ".price-shower"
+AMOUNT_SELECTOR = ".list_limit span span:first-child"
+
+# Un solo viaje al navegador: devuelve [nombre, precio, monto] de todas las tarjetas
+BULK_EXTRACT_JS = """
+(cards, [nameSel, priceSel, amountSel]) => cards.map((card) => {
+    const text = (sel) => {
+        const el = card.querySelector(sel);
+        return el ? el.innerText : null;
+    };
+    return [text(nameSel), text(priceSel), text(amountSel)];
+})
+"""
+
+# Cuántas páginas se extrajeron por cada camino ("bulk", "bulk_failed" o "per_card")
+EXTRACTION_PAGES = REGISTRY.counter(
+    "p2p_extraction_pages_total", "Páginas extraídas del DOM por camino de extracción", ("path",))
+
+# --- Origen de los Datos ---
+# "auto": JSON de las XHR del hall y, si no llega, DOM; "network" o "dom" fuerzan uno
+SCRAPE_SOURCE = os.environ.get('SCRAPE_SOURCE', 'auto')
+# Espera máxima de la página 1 por red (llega junto con la carga inicial). En "auto" la
+# espera termina antes si la lista ya se pintó sin que llegara el JSON (ver NETWORK_RENDER_GRACE)
+NETWORK_FIRST_PAGE_TIMEOUT = float(os.environ.get('SCRAPE_NETWORK_FIRST_PAGE_TIMEOUT', 20))
+NETWORK_RENDER_GRACE = 1.0   # segundos extra para la XHR una vez renderizada la lista
+NETWORK_PAGE_TIMEOUT = 10
+# En "auto", si la lista no llegó por red pero sí por DOM, los scrapeos de ese sitio van
+# directo al DOM durante SCRAPE_NETWORK_RETRY_AFTER segundos (0: siempre se prueba la red)
+SCRAPE_NETWORK_RETRY_AFTER = float(os.environ.get('SCRAPE_NETWORK_RETRY_AFTER', 1800))
+
+# Cuántos scrapeos salieron de cada origen ("network", "dom", "network_failed", "network_skipped")
+SCRAPE_SOURCES = REGISTRY.counter("p2p_scrape_source_total", "Scrapeos por origen de los datos", ("side", "source"))
+
+# Peticiones y bytes de los scrapeos (ver resource_filter.py)
+SCRAPE_REQUESTS = REGISTRY.counter(
+    "p2p_scrape_requests_total", "Peticiones del navegador durante los scrapeos", ("side", "result"))
+SCRAPE_BYTES = REGISTRY.counter("p2p_scrape_bytes_total", "Bytes descargados durante los scrapeos", ("side",))
+
+# --- Salida Temprana si la Página 1 no Cambió ---
+# Si los anuncios de la página 1 (merchant, precio, monto) son idénticos a los del
+# último recorrido completo y ese recorrido tiene menos de SCRAPE_DEEP_MAX_AGE
+# segundos, las páginas 2..N se toman de él en lugar de recorrerlas de nuevo.
+# 0 desactiva la reutilización.
+SCRAPE_DEEP_MAX_AGE = float(os.environ.get('SCRAPE_DEEP_MAX_AGE', 300))
+DEEP_PAGES_REUSED = REGISTRY.counter(
+    "p2p_deep_pages_reused_total", "Scrapeos que reutilizaron las páginas 2..N (página 1 sin cambios)", ("side",))
+
+
+# --- Funciones Auxiliares ---
+def dedupe_adverts(records):
+    """
+    Quita anuncios repetidos (mismo merchant y precio): mientras se recorre el libro
+    un anuncio puede correrse de una página a otra y aparecer dos veces.
+    Se conserva la primera aparición (la de la página más baja).
+    """
+    seen = set()
+    unique = []
+    for record in sorted(records, key=lambda r: r["pagina"]):
+        key = (record["merchant"], record["precio_bob"])
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(record)
+    return unique
+
+
+class RecordsCallbackError(Exception):
+    """
+    Falló el `on_records` de quien consume el scrapeo (no el scrapeo): se propaga
+    tal cual en lugar de tomarse como un error de scrapeo. La causa está en `__cause__`.
+    """
+
+
+class ScrapeFailed(Exception):
+    """Un lado no devolvió ningún anuncio y el scrapeo no terminó bien: no hay nada que publicar."""
+
+
+class ScrapeResult(list):
+    """
+    Anuncios de un scrapeo (una lista común, para los que solo quieren los registros)
+    con cómo terminó: `outcome` ("ok", "no_data", "deadline", "error"), `source`
+    ("network" / "dom") y el estado de cada página en `pages`.
+    """
+
+    def __init__(self, records=(), outcome="error", source=None, pages=None, error=None):
+        super().__init__(records)
+        self.outcome = outcome
+        self.source = source
+        self.pages = dict(pages or {})
+        self.error = error
+
+    @property
+    def complete(self):
+        """Terminó bien y ninguna página se saltó (llegar al final del libro no cuenta como salto)."""
+        return self.outcome == "ok" and all(status in ("read", "reused") for status in self.pages.values())
+
+    @property
+    def partial(self):
+        return not self.complete
+
+
+class PageLog:
+    """
+    Estado de cada página del scrapeo: "read", "reused" (tomada del último recorrido
+    completo) o el motivo por el que se saltó ("timeout", "not_activated").
+
+    Si se da `on_records(registros)`, se llama con cada página apenas se lee, sin los
+    anuncios ya emitidos en páginas anteriores (el mismo criterio que `dedupe_adverts`).
+    """
+
+    def __init__(self, on_records=None):
+        self.on_records = on_records
+        self.pages = {}
+        self._seen = set()
+
+    def read(self, page_num, records):
+        self.pages[page_num] = "read"
+        self._emit(records)
+
+    def reused(self, records):
+        for page_num in {r["pagina"] for r in records}:
+            self.pages[page_num] = "reused"
+        self._emit(records)
+
+    def skipped(self, page_num, reason):
+        self.pages[page_num] = reason
+
+    def _emit(self, records):
+        if self.on_records is None:
+            return
+        fresh = []
+        for record in records:
+            key = (record["merchant"], record["precio_bob"])
+            if key not in self._seen:
+                self._seen.add(key)
+                fresh.append(record)
+        if fresh:
+            try:
+                self.on_records(fresh)
+            except Exception as e:
+                raise RecordsCallbackError(f"on_records falló: {e!r}") from e
+
+
+def fingerprint_adverts(records):
+    """Huella de una página de anuncios: merchant, precio y monto, sin importar el orden."""
+    rows = sorted((str(r.get("merchant")), r.get("precio_bob") or 0.0, r.get("monto_usdt") or 0.0) for r in records)
+    return hashlib.blake2b(repr(rows).encode(), digest_size=16).hexdigest()
+
+
+class DeepPageCache:
+    """
+    Último recorrido completo por URL: huella de la página 1 y los registros de
+    las páginas 2..N. `lookup` los devuelve si la página 1 no cambió y el
+    recorrido es lo bastante reciente.
+    """
+
+    def __init__(self, max_age=SCRAPE_DEEP_MAX_AGE):
+        self.max_age = max_age
+        self._entries = {}   # url -> (huella, max_pages, time.monotonic(), registros de páginas 2..N)
+
+    def lookup(self, url, fingerprint, max_pages):
+        entry = self._entries.get(url)
+        if entry is None or not self.max_age:
+            return None
+        saved_fingerprint, saved_pages, saved_at, deeper = entry
+        if saved_fingerprint != fingerprint or saved_pages < max_pages or time.monotonic() - saved_at > self.max_age:
+            return None
+        return [r for r in deeper if r["pagina"] <= max_pages]
+
+    def store(self, url, fingerprint, max_pages, records):
+        self._entries[url] = (fingerprint, max_pages, time.monotonic(), [r for r in records if r["pagina"] > 1])
+
+
+default_deep_cache = DeepPageCache()
+
+
+class NetworkSourceMemory:
+    """
+    Sitios donde, en modo "auto", la lista no llegó por red pero sí por DOM (el
+    patrón de la XHR no coincide). Durante `retry_after` segundos sus scrapeos van
+    directo al DOM; después se vuelve a probar la red y un acierto borra la marca.
+    """
+
+    def __init__(self, retry_after=SCRAPE_NETWORK_RETRY_AFTER):
+        self.retry_after = retry_after
+        self._failed_at = {}   # sitio -> time.monotonic() del último fallo
+
+    def skip(self, site):
+        failed_at = self._failed_at.get(site)
+        return failed_at is not None and time.monotonic() - failed_at < self.retry_after
+
+    def failed(self, site):
+        self._failed_at[site] = time.monotonic()
+
+    def succeeded(self, site):
+        self._failed_at.pop(site, None)
+
+
+default_network_sources = NetworkSourceMemory()
+
+
+def _discard(task):
+    """Cancela una tarea auxiliar sin dejar excepciones sin recoger."""
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+
+
+def clean_number(text):
+    """Limpia texto y devuelve float."""
+    if not text: return None
+    text = text.upper().replace("BOB", "").replace("USDT", "").replace("≈", "").replace(",", "").strip()
+    match = re.findall(r"[0-9\.]+", text)
+    if not match: return None
+    try: return float(match[0])
+    except: return None
+
+
+async def _extract_cards_bulk(page):
+    """Extrae todas las tarjetas de la página con una sola llamada a $$eval."""
+    return await page.eval_on_selector_all(
+        CARD_SELECTOR, BULK_EXTRACT_JS, [NAME_SELECTOR, PRICE_SELECTOR, AMOUNT_SELECTOR]
+    )
+
+
+async def _extract_cards_per_card(page):
+    """Camino original: tres consultas por tarjeta (varios viajes al navegador por anuncio)."""
+    rows = []
+    cards = await page.query_selector_all(CARD_SELECTOR)
+    for card in cards:
+        name_el = await card.query_selector(NAME_SELECTOR)
+        name = await name_el.inner_text() if name_el else None
+
+        price_el = await card.query_selector(PRICE_SELECTOR)
+        raw_price = await price_el.inner_text() if price_el else None
+
+        amount_el = await card.query_selector(AMOUNT_SELECTOR)
+        raw_amount = await amount_el.inner_text() if amount_el else None
+
+        rows.append([name, raw_price, raw_amount])
+    return rows
+
+
+async def extract_cards(page, bulk=True, trace=None):
+    """
+    Devuelve `[nombre, precio, monto]` (texto crudo) por cada tarjeta de la página.
+
+    Intenta primero la extracción en bloque; si el script falla se usa el
+    camino tarjeta por tarjeta. `p2p_extraction_pages_total` cuenta qué camino se usó.
+    """
+    if bulk:
+        try:
+            rows = await _extract_cards_bulk(page)
+            EXTRACTION_PAGES.inc(path="bulk")
+            return rows
+        except Exception as e:
+            print(f"Extracción en bloque fallida, usando tarjeta por tarjeta: {e}")
+            EXTRACTION_PAGES.inc(path="bulk_failed")
+            if trace is not None:
+                trace.fallback("per_card")
+
+    rows = await _extract_cards_per_card(page)
+    EXTRACTION_PAGES.inc(path="per_card")
+    return rows
+
+
+async def _wait_first_page(capture, deadline, list_ready=None):
+    """
+    Espera la página 1 por red. Con `list_ready` (tarea que espera la lista renderizada)
+    las dos corren a la par: si la lista se pinta y el JSON no llega en
+    NETWORK_RENDER_GRACE segundos, no se espera el resto de NETWORK_FIRST_PAGE_TIMEOUT.
+    """
+    first = asyncio.ensure_future(
+        capture.wait_for_page(1, timeout=min(NETWORK_FIRST_PAGE_TIMEOUT, deadline.remaining())))
+    try:
+        if list_ready is not None:
+            await asyncio.wait({first, list_ready}, return_when=asyncio.FIRST_COMPLETED)
+            # Si la espera del DOM falló, solo queda la red
+            if not first.done() and not list_ready.cancelled() and list_ready.exception() is None:
+                await asyncio.wait({first}, timeout=min(NETWORK_RENDER_GRACE, deadline.remaining()))
+                if not first.done():
+                    return None
+        return await first
+    finally:
+        _discard(first)
+
+
+async def _scrape_via_network(page, capture, deadline, max_pages, log, trace, all_results, on_first_page, pages,
+                              list_ready=None):
+    """
+    Lee las páginas 1..max_pages desde las respuestas JSON capturadas y las agrega
+    a `all_results` a medida que llegan (si el scrapeo se corta, lo leído no se pierde).
+    Devuelve None si la página 1 no llegó (para caer al scrapeo por DOM); con
+    `list_ready` no se espera más que a la lista renderizada (ver _wait_first_page).
+    Si `on_first_page(registros)` devuelve las páginas 2..N (sin cambios), no se piden.
+    Cada página leída o saltada se anota en `pages` (PageLog), en orden.
+
+    Las páginas 2..N se piden en paralelo repitiendo la petición de la página 1;
+    las que fallen se piden de a una haciendo clic en el paginador.
+    """
+    with trace.span("network_first_page"):
+        records = await _wait_first_page(capture, deadline, list_ready)
+    if records is None:
+        return None
+    all_results.extend(records)
+    trace.page_read("network")
+    log(f"   -> Página 1 capturada por red: {len(records)} ofertas.")
+    pages.read(1, records)
+
+    deeper = on_first_page(records)
+    if deeper is not None:
+        log(f"   -> Página 1 sin cambios: se reutilizan {len(deeper)} ofertas de las páginas siguientes.")
+        pages.reused(deeper)
+        all_results.extend(deeper)
+        return all_results
+
+    if max_pages > 1:
+        with trace.span("network_parallel_pages"):
+            try:
+                await asyncio.wait_for(
+                    capture.fetch_pages(page.request, range(2, max_pages + 1), PAGE_CONCURRENCY),
+                    timeout=deadline.remaining(),
+                )
+            except asyncio.TimeoutError:
+                pass
+        log(f"   -> Páginas pedidas en paralelo: {sorted(n for n in capture.pages if n > 1)}")
+
+    for page_num in range(2, max_pages + 1):
+        if page_num not in capture.pages:
+            trace.fallback("pager_click")
+            target_page_locator = page.locator(".bit-pager li.number").get_by_text(str(page_num), exact=True)
+            try:
+                # El JSON suele llegar antes de que se renderice el paginador
+                await target_page_locator.first.wait_for(
+                    state="attached", timeout=deadline.timeout_ms(NETWORK_PAGE_TIMEOUT * 1000)
+                )
+            except DeadlineExceeded:
+                raise
+            except Exception:
+                pass
+            if await target_page_locator.count() == 0:
+                log(f"   -> No se encontró el número de página {page_num}. Finalizando.")
+                trace.page_skipped("no_pager")
+                break
+            # dispatch_event no se bloquea por modales superpuestos: solo queremos disparar el XHR
+            await target_page_locator.first.dispatch_event("click")
+
+        with trace.span("network_page"):
+            records = await capture.wait_for_page(page_num, timeout=min(NETWORK_PAGE_TIMEOUT, deadline.remaining()))
+        if records is None:
+            log(f"   -> La página {page_num} no llegó por red a tiempo. Finalizando.")
+            trace.page_skipped("timeout")
+            pages.skipped(page_num, "timeout")
+            break
+        if not records:
+            log(f"   -> La página {page_num} llegó vacía: fin del libro.")
+            pages.read(page_num, records)
+            break
+        trace.page_read("network")
+        log(f"   -> Página {page_num} capturada por red: {len(records)} ofertas.")
+        all_results.extend(records)
+        pages.read(page_num, records)
+
+    return all_results
+
+
+async def _scrape_via_dom(page, operation_type, deadline, max_pages, log, bulk_extract, all_results, trace,
+                          on_first_page, pages, on_popups_dismissed=None):
+    """
+    Scrapeo por DOM: espera la lista renderizada y recorre el paginador.
+    Todas las esperas son por condición (lista estable, página activa) dentro de `deadline`.
+    Si `on_first_page(registros)` devuelve las páginas 2..N (sin cambios), no se recorren.
+    Cada página extraída o saltada se anota en `pages` (PageLog).
+    `on_popups_dismissed()` (corrutina) se llama si hubo que cerrar avisos al cargar.
+    """
+    log("Esperando a que la lista de ofertas sea visible...")
+    with trace.span("list_ready"):
+        await wait_for_list_ready(page, deadline)
+
+    # --- Lógica de Cierre de Popups (solo si hay alguno visible) ---
+    with trace.span("popups"):
+        dismissed = await dismiss_popups(page)
+    if dismissed:
+        log("Modales cerrados.")
+        if on_popups_dismissed is not None:
+            await on_popups_dismissed()
+
+    # --- Bucle de Paginación y Scraping ---
+    # (secuencial: el paginador solo muestra los números cercanos a la página activa)
+    for page_num in range(1, max_pages + 1):
+        page_str = str(page_num)
+
+        # ⚠️ 1. NAVEGACIÓN (Solo hacer clic si no estamos en la página 1)
+        if page_num > 1:
+            log(f"   -> Haciendo clic en el número de página {page_str}...")
+
+            target_page_locator = page.get_by_text(page_str, exact=True)
+
+            if await target_page_locator.count() == 0:
+                log(f"   -> No se encontró el número de página {page_str}. Finalizando.")
+                trace.page_skipped("no_pager")
+                break
+
+            with trace.span("paginate"):
+                # Un modal tardío interceptaría el clic forzado
+                await dismiss_popups(page)
+                previous_signature = await list_signature(page)
+                await target_page_locator.click(force=True, timeout=deadline.timeout_ms(10000))
+
+                # Esperamos a que la página se active y la lista se actualice
+                try:
+                    await wait_for_page_change(page, page_num, previous_signature, deadline)
+                    activated = True
+                except DeadlineExceeded:
+                    raise
+                except Exception:
+                    activated = False
+            if not activated:
+                log(f"   -> Error: La página {page_str} no se activó a tiempo. Saltando la extracción de esta página.")
+                trace.page_skipped("not_activated")
+                pages.skipped(page_num, "not_activated")
+                continue
+
+        # 📝 2. EXTRACCIÓN DE DATOS
+        log(f"--- Escrapeando Página {page_num} ({operation_type}) ---")
+
+        with trace.span("extract"):
+            rows = await extract_cards(page, bulk=bulk_extract, trace=trace)
+        trace.page_read("dom")
+        log(f"   -> Encontradas {len(rows)} ofertas.")
+
+        page_records = [
+            {
+                "tipo": operation_type,
+                "pagina": page_num,
+                "merchant": (name or "N/A").strip(),
+                "precio_bob": clean_number(raw_price),
+                "monto_usdt": clean_number(raw_amount),
+            }
+            for name, raw_price, raw_amount in rows
+        ]
+        all_results.extend(page_records)
+        pages.read(page_num, page_records)
+
+        if page_num == 1:
+            deeper = on_first_page(page_records)
+            if deeper is not None:
+                log(f"   -> Página 1 sin cambios: se reutilizan {len(deeper)} ofertas de las páginas siguientes.")
+                all_results.extend(deeper)
+                pages.reused(deeper)
+                break
+
+    return all_results
+
+
+# --- Función de Scraping Reutilizable ---
+async def scrape_bitget_p2p(url: str, operation_type: str, browser_manager=None, verbose=False,
+                            bulk_extract=True, source=None, max_pages=None, storage_states=None, deep_cache=None,
+                            on_records=None, network_sources=None):
+    """
+    Scrapea las primeras `max_pages` (MAX_PAGES por defecto) páginas del hall P2P de Bitget.
+    Los anuncios repetidos entre páginas (mismo merchant y precio) se descartan.
+
+    Usa un BrowserContext prestado por `browser_manager` (el navegador compartido
+    del proceso si no se indica). Con `verbose=False` solo se imprimen errores.
+    `bulk_extract=False` fuerza la extracción tarjeta por tarjeta.
+
+    `source` elige de dónde salen los datos: "network" lee el JSON de las XHR del
+    hall, "dom" el HTML renderizado y "auto" (por defecto, ver SCRAPE_SOURCE)
+    intenta la red y cae al DOM si la lista no llega por red. En "auto" la espera
+    de la red corre a la par con la del DOM, y los sitios donde la red no funcionó
+    (`network_sources`, por defecto los del proceso) van un tiempo directo al DOM.
+
+    El contexto arranca con el storage state guardado del sitio (`storage_states`,
+    por defecto el del proceso) y, si aun así hubo que cerrar avisos, se guarda el nuevo.
+
+    Si la página 1 es idéntica a la del último recorrido completo reciente
+    (`deep_cache`, por defecto el del proceso), las páginas 2..N se reutilizan.
+
+    `on_records(registros)` se llama con cada página apenas se lee (sin repetidos),
+    para consumir el libro en streaming sin esperar el final del scrapeo. Si falla,
+    el scrapeo se corta con RecordsCallbackError.
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+    browser_manager = browser_manager or default_browser_manager
+    storage_states = storage_states or default_storage_states
+    deep_cache = deep_cache or default_deep_cache
+    network_sources = network_sources or default_network_sources
+    source = source or SCRAPE_SOURCE
+    max_pages = max_pages or MAX_PAGES
+    deadline = Deadline(SCRAPE_BUDGET)
+    all_results = []
+    pages = PageLog(on_records)
+
+    log(f"\n--- INICIANDO SCRAPE: {operation_type.upper()} ---")
+
+    # Fases con su duración (p2p_scrape_phase_seconds y, con SCRAPE_TRACE_LOG, una línea JSON)
+    trace = ScrapeTrace(operation_type, url)
+    outcome, used_source, results, error = "error", None, [], None
+
+    resource_filter = ResourceFilter(url)
+    context_options = resource_filter.context_options()
+    saved_state = storage_states.get(resource_filter.site)
+    if saved_state is not None:
+        # Con cookies y localStorage de una sesión anterior el sitio no vuelve a mostrar los avisos
+        context_options["storage_state"] = saved_state
+    context_started = time.monotonic()
+    try:
+        # Tope duro: lo que no tenga timeout propio (lanzar Chromium, evaluate...) se corta igual
+        async with deadline.enforce(SCRAPE_DEADLINE_GRACE), browser_manager.context(**context_options) as context:
+            # Incluye la espera por un lugar libre y, en frío, el lanzamiento de Chromium
+            trace.record("context", context_started)
+            await resource_filter.install(context)
+            page = await context.new_page()
+
+            async def save_storage_state():
+                if saved_state is not None:
+                    storage_states.mark_stale(resource_filter.site)
+                try:
+                    with trace.span("save_storage_state"):
+                        await storage_states.save(resource_filter.site, context)
+                except Exception as e:
+                    print(f"No se pudo guardar el estado del navegador: {e}")
+
+            # Huella de la página 1: decide si hace falta recorrer las siguientes
+            first_page = {"fingerprint": None, "reused": False}
+
+            def on_first_page(records):
+                if max_pages < 2:
+                    return None
+                first_page["fingerprint"] = fingerprint_adverts(records)
+                deeper = deep_cache.lookup(url, first_page["fingerprint"], max_pages)
+                if deeper is not None:
+                    first_page["reused"] = True
+                    DEEP_PAGES_REUSED.inc(side=operation_type)
+                    trace.count("deep_pages_reused")
+                return deeper
+
+            capture = None
+            if source == "auto" and network_sources.skip(resource_filter.site):
+                log("La red no trajo la lista en los últimos scrapeos de este sitio: directo al DOM.")
+                SCRAPE_SOURCES.inc(side=operation_type, source="network_skipped")
+            elif source in ("network", "auto"):
+                capture = AdvertCapture(operation_type)
+                capture.attach(page)
+            list_ready = None
+
+            try:
+                log(f"Navegando a {url}...")
+                with trace.span("goto"):
+                    await page.goto(url, timeout=deadline.timeout_ms(90000))
+
+                network_results = None
+                if capture is not None:
+                    used_source = "network"
+                    if source == "auto":
+                        list_ready = asyncio.ensure_future(wait_for_list_ready(page, deadline))
+                    network_results = await _scrape_via_network(page, capture, deadline, max_pages, log, trace,
+                                                                all_results, on_first_page, pages, list_ready)
+                    if network_results is not None:
+                        SCRAPE_SOURCES.inc(side=operation_type, source="network")
+                        network_sources.succeeded(resource_filter.site)
+                        outcome, results = "ok", dedupe_adverts(network_results)
+                    else:
+                        SCRAPE_SOURCES.inc(side=operation_type, source="network_failed")
+                        if source == "network":
+                            print(f"No llegó la lista de anuncios por red ({operation_type}).")
+                            outcome, error = "no_data", "la lista no llegó por red"
+                        else:
+                            log("La lista no llegó por red, usando el scrapeo por DOM...")
+                            trace.fallback("dom")
+
+                if network_results is None and source != "network":
+                    SCRAPE_SOURCES.inc(side=operation_type, source="dom")
+                    used_source = "dom"
+                    await _scrape_via_dom(page, operation_type, deadline, max_pages, log, bulk_extract, all_results,
+                                          trace, on_first_page, pages, on_popups_dismissed=save_storage_state)
+                    outcome, results = "ok", dedupe_adverts(all_results)
+                    if capture is not None:
+                        # La lista se pintó pero su XHR no se reconoció: los próximos van directo al DOM
+                        network_sources.failed(resource_filter.site)
+
+            except RecordsCallbackError:
+                raise
+
+            except DeadlineExceeded as e:
+                print(f"Scrapeo de {operation_type} cortado por tiempo ({e}), devolviendo {len(all_results)} registros.")
+                outcome, results, error = "deadline", dedupe_adverts(all_results), str(e)
+
+            except Exception as e:
+                # Las esperas de Playwright topadas por el presupuesto fallan con su propio TimeoutError
+                outcome = "deadline" if deadline.expired else "error"
+                # Imprimimos el error, pero permitimos que continúe con lo que haya
+                print(f"Ocurrió un error en el scrapeo de {operation_type}: {e}")
+                results, error = dedupe_adverts(all_results), str(e)
+
+            finally:
+                _discard(list_ready)
+                # Solo un recorrido completo y sin páginas saltadas sirve de base para reutilizar
+                complete = outcome == "ok" and all(status == "read" for status in pages.pages.values())
+                if complete and first_page["fingerprint"] is not None and not first_page["reused"]:
+                    deep_cache.store(url, first_page["fingerprint"], max_pages, results)
+                stats = resource_filter.stats()
+                SCRAPE_REQUESTS.inc(stats["requests_allowed"], side=operation_type, result="allowed")
+                SCRAPE_REQUESTS.inc(stats["requests_blocked"], side=operation_type, result="blocked")
+                SCRAPE_BYTES.inc(stats["bytes_transferred"], side=operation_type)
+                log(
+                    f"--- SCRAPE COMPLETADO: {operation_type.upper()} "
+                    f"({stats['requests_allowed']} peticiones, {stats['requests_blocked']} bloqueadas, "
+                    f"{stats['bytes_transferred'] / 1024:,.0f} KB) ---"
+                )
+
+    except RecordsCallbackError:
+        raise
+
+    except DeadlineExceeded as e:
+        # El tope duro cortó una operación colgada: se devuelve lo leído hasta ahí
+        print(f"Scrapeo de {operation_type} cortado por tiempo ({e}), devolviendo {len(all_results)} registros.")
+        outcome, results, error = "deadline", dedupe_adverts(all_results or results), str(e)
+
+    except ContextRejected as e:
+        # El navegador rechazó las opciones del contexto: un storage state guardado inválido se descarta
+        print(f"Ocurrió un error en el scrapeo de {operation_type}: {e}")
+        outcome, error = "error", str(e)
+        if saved_state is not None:
+            storage_states.mark_stale(resource_filter.site)
+
+    except Exception as e:
+        # No se pudo conseguir un contexto (navegador caído o en espera de relanzamiento):
+        # el estado guardado no tiene la culpa y se conserva
+        print(f"Ocurrió un error en el scrapeo de {operation_type}: {e}")
+        outcome, error = "error", str(e)
+
+    finally:
+        trace.finish(outcome, len(results), used_source)
+
+    result = ScrapeResult(results, outcome=outcome, source=used_source, pages=pages.pages, error=error)
+    if result.partial:
+        log(f"Resultado parcial de {operation_type}: {outcome}, páginas {result.pages}")
+    return result
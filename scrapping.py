@@ -1,10 +1,24 @@
+"""
+Scrapeo por consola.
+
+Sin opciones imprime el resumen, el JSON de ambos lados y los histogramas al final.
+Con --ndjson escribe cada anuncio como una línea JSON compacta apenas se lee su
+página (memoria constante, apto para `jq` o un colector de larga duración):
+
+    python scrapping.py --ndjson --market bitget:USDT:ARS --pages 3 --interval 60 --output libro.ndjson
+    python scrapping.py --ndjson | jq -c 'select(.precio_bob < 7)'
+"""
+import argparse
 import asyncio
-from playwright.async_api import async_playwright
+import contextlib
 import json
-import re
+import os
 import sys
+import time
 sys.stdout.reconfigure(encoding='utf-8')
 from collections import defaultdict
+from markets import DEFAULT_MARKET, get_market
+from scraper import RecordsCallbackError, scrape_bitget_p2p, default_browser_manager
 
 # Forzar codificación UTF-8 en consola para evitar errores de impresión
 try:
@@ -12,133 +26,50 @@ try:
 except AttributeError:
     pass
 
-# --- URLs Definidas ---
-URL_VENTAS = "https://www.bitget.com/p2p-trade/sell?paymethodIds=-1&fiatName=BOB"
-URL_COMPRAS = "https://www.bitget.com/p2p-trade?paymethodIds=-1&fiatName=BOB" # URL modificada para compras
-
-# --- Función Auxiliar ---
-def clean_number(text):
-    """Limpia texto y devuelve float."""
-    if not text: return None
-    text = text.upper().replace("BOB", "").replace("USDT", "").replace("≈", "").replace(",", "").strip()
-    match = re.findall(r"[0-9\.]+", text)
-    if not match: return None
-    try: return float(match[0])
-    except: return None
-
-# --- Función de Scraping Reutilizable ---
-async def scrape_bitget_p2p(url: str, operation_type: str):
-    all_results = []
-    MAX_PAGES = 2
-
-    print(f"\n--- INICIANDO SCRAPE: {operation_type.upper()} ---")
-
-    async with async_playwright() as pw:
-        # Configuración Anti-Detección
-        browser = await pw.chromium.launch(
-            headless=True,  
-            args=["--disable-blink-features=AutomationControlled"]
-        )
-
-        context = await browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        await context.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        
-        page = await context.new_page()
-
-        try:
-            print(f"Navegando a {url}...")
-            await page.goto(url, timeout=90000) 
-
-            # --- Lógica de Cierre de Popups ---
-            print("Intentando cerrar modales...")
-            await page.wait_for_timeout(4000) 
-            await page.keyboard.press("Escape")
-            await page.wait_for_timeout(500)
-            await page.mouse.click(50, 50)
-            await page.wait_for_timeout(500)
-            
-            try: await page.locator('.bit-dialog__close').click(timeout=3000)
-            except Exception: pass
-            
-            try: await page.get_by_test_id('MicroCookieAcceptButton').click(timeout=3000)
-            except Exception: pass
-            
-            print("Esperando a que la lista de ofertas sea visible...")
-            await page.wait_for_selector(".hall-list-item", state="visible", timeout=60000)
-            
-            # --- Bucle de Paginación y Scraping ---
-            for page_num in range(1, MAX_PAGES + 1):
-                page_str = str(page_num)
-
-                # ⚠️ 1. NAVEGACIÓN (Solo hacer clic si no estamos en la página 1)
-                if page_num > 1:
-                    print(f"   -> Haciendo clic en el número de página {page_str}...")
-                    
-                    target_page_locator = page.get_by_text(page_str, exact=True)
-
-                    if await target_page_locator.count() == 0:
-                        print(f"   -> No se encontró el número de página {page_str}. Finalizando.")
-                        break
-
-                    await target_page_locator.click(force=True)
-                    
-                    # Esperamos a que la página se active
-                    try:
-                        await page.wait_for_selector(
-                            f'.bit-pager li.number.active:has-text("{page_str}")',
-                            timeout=10000 
-                        )
-                        await page.wait_for_timeout(1500) 
-                    except Exception:
-                        print(f"   -> Error: La página {page_str} no se activó a tiempo. Saltando la extracción de esta página.")
-                        continue 
-
-                # 📝 2. EXTRACCIÓN DE DATOS
-                print(f"--- Escrapeando Página {page_num} ({operation_type}) ---")
-                
-                await page.wait_for_timeout(1000)
-                cards = await page.query_selector_all(".hall-list-item")
-                print(f"   -> Encontradas {len(cards)} ofertas.")
-
-                for card in cards:
-                    name_el = await card.query_selector(".list-item__nickname")
-                    name = await name_el.inner_text() if name_el else "N/A"
-
-                    price_el = await card.query_selector(".price-shower")
-                    raw_price = await price_el.inner_text() if price_el else None
-
-                    amount_el = await card.query_selector(".list_limit span span:first-child")
-                    raw_amount = await amount_el.inner_text() if amount_el else None
-                    
-                    all_results.append({
-                        "tipo": operation_type,
-                        "pagina": page_num,
-                        "merchant": name.strip(),
-                        "precio_bob": clean_number(raw_price),
-                        "monto_usdt": clean_number(raw_amount),
-                    })
-
-            return all_results
-
-        except Exception as e:
-            print(f"Ocurrió un error en el scrapeo de {operation_type}: {e}")
-            return all_results
-        
-        finally:
-            await browser.close()
-            print(f"--- SCRAPE COMPLETADO: {operation_type.upper()} ---")
+# --- Modo Streaming (NDJSON) ---
+async def stream_ndjson(market, max_pages, interval, out):
+    """
+    Escribe en `out` una línea JSON por anuncio a medida que llega cada página,
+    con el mercado y la hora del scrapeo. Con `interval` > 0 repite para siempre.
+    """
+    url_ventas, url_compras = market.urls()
+    try:
+        while True:
+            started = time.monotonic()
+            ts = round(time.time(), 3)
+
+            def write(records):
+                for record in records:
+                    out.write(json.dumps({"mercado": market.key, "ts": ts, **record},
+                                         ensure_ascii=False, separators=(",", ":")))
+                    out.write("\n")
+                out.flush()
+
+            # Los dos lados escriben intercalados, página por página
+            await asyncio.gather(
+                scrape_bitget_p2p(url_ventas, "ventas", max_pages=max_pages, on_records=write),
+                scrape_bitget_p2p(url_compras, "compras", max_pages=max_pages, on_records=write),
+            )
+            if interval <= 0:
+                break
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        await default_browser_manager.close()
+
 
 # --- Ejecución Principal ---
-async def main():
+async def main(market=DEFAULT_MARKET, max_pages=None):
+    url_ventas, url_compras = market.urls()
     # Lanzar ambas tareas asíncronamente
-    ventas_task = scrape_bitget_p2p(URL_VENTAS, "ventas")
-    compras_task = scrape_bitget_p2p(URL_COMPRAS, "compras")
+    # (ambas comparten un único Chromium: se lanza una vez y cada lado usa su propio contexto)
+    ventas_task = scrape_bitget_p2p(url_ventas, "ventas", verbose=True, max_pages=max_pages)
+    compras_task = scrape_bitget_p2p(url_compras, "compras", verbose=True, max_pages=max_pages)
 
     # Esperar a que ambas tareas finalicen
-    results = await asyncio.gather(ventas_task, compras_task)
+    try:
+        results = await asyncio.gather(ventas_task, compras_task)
+    finally:
+        await default_browser_manager.close()
     
     # Asignar resultados a las variables solicitadas (data_ventas y data_compras)
     # ----------------------------------------------------------------------
@@ -162,6 +93,7 @@ async def main():
     total_c = len(data_compras)
     paginas_c = len(set([d['pagina'] for d in data_compras if 'pagina' in d]))
     print(f"COMPRAS: Total registros: {total_c} | Páginas escaneadas: {paginas_c}")
+    print(default_browser_manager.report())
 
     print("\n" + "="*50)
     print("IMPRESIÓN DE data_ventas")
@@ -249,5 +181,44 @@ async def main():
             procesar_datos(data_compras, estado)
 
 
+def cli():
+    parser = argparse.ArgumentParser(description="Scrapeo del hall P2P por consola.")
+    parser.add_argument("--market", default=DEFAULT_MARKET.key.replace("/", ":"),
+                        help="exchange:activo:fiat (p. ej. bitget:USDT:BOB)")
+    parser.add_argument("--pages", type=int, default=None, help="páginas por lado (MAX_PAGES por defecto)")
+    parser.add_argument("--ndjson", action="store_true", help="una línea JSON por anuncio, a medida que se lee")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="con --ndjson: repetir cada N segundos (0 = una sola vez)")
+    parser.add_argument("--output", default="-", help="con --ndjson: archivo donde agregar las líneas (- = stdout)")
+    args = parser.parse_args()
+
+    parts = args.market.split(":")
+    market = get_market(*parts) if len(parts) == 3 else None
+    if market is None:
+        parser.error(f"mercado desconocido: {args.market} (ver P2P_MARKETS)")
+
+    if not args.ndjson:
+        asyncio.run(main(market, args.pages))
+        return
+
+    out = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    try:
+        # Los avisos del scraper van a stderr para no mezclarse con las líneas NDJSON
+        with contextlib.redirect_stdout(sys.stderr):
+            asyncio.run(stream_ndjson(market, args.pages, args.interval, out))
+    except KeyboardInterrupt:
+        pass
+    except RecordsCallbackError as e:
+        if not isinstance(e.__cause__, BrokenPipeError):
+            raise
+        # El lector (p. ej. `head`) cerró la tubería: no es un error. stdout se apunta a
+        # /dev/null para que el flush al salir no vuelva a fallar
+        if out is sys.stdout:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    cli()
\ No newline at end of file
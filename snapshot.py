@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+# --- Último Snapshot en Disco ---
+# Cada snapshot publicado se guarda en SNAPSHOT_FILE (vacío lo desactiva) para que,
+# tras un reinicio, la página muestre el último libro conocido mientras llega el
+# primer scrapeo. No se restauran los de más de SNAPSHOT_RESTORE_MAX_AGE segundos.
+SNAPSHOT_FILE = os.environ.get('SNAPSHOT_FILE', 'data/snapshots.json')
+SNAPSHOT_RESTORE_MAX_AGE = float(os.environ.get('SNAPSHOT_RESTORE_MAX_AGE', 6 * 3600))
+
+
+# --- Snapshot Inmutable ---
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Resultado de un scrapeo completo (ventas + compras) de un mercado.
+
+    Las listas se guardan como tuplas: ningún lector debe modificar un snapshot,
+    si hace falta otro estado se publica un snapshot nuevo con otra versión.
+    """
+    market: str         # Clave del mercado ("bitget/USDT/BOB")
+    version: int        # Creciente en todo el almacén (única entre mercados)
+    created_at: float   # time.time() del momento de publicación
+    duration: float     # Segundos que tardó el scrapeo
+    data_ventas: tuple
+    data_compras: tuple
+    complete: bool = True   # False si algún lado quedó parcial (páginas saltadas o cortado por tiempo)
+    # Estado de cada página por lado: {"ventas": {1: "read", 2: "timeout"}, "compras": {...}}
+    # ("read", "reused" o el motivo del salto, ver scraper.PageLog)
+    pages: dict = field(default_factory=dict)
+
+    @property
+    def age(self):
+        """Segundos transcurridos desde la publicación."""
+        return max(0.0, time.time() - self.created_at)
+
+
+class SnapshotStore:
+    """
+    Guarda el último snapshot publicado de cada mercado.
+
+    La lectura (`latest`) es una simple lectura de diccionario, sin locks: los
+    snapshots se reemplazan enteros, nunca se modifican en sitio.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest = {}
+        self._version = 0
+        self._failures = {}
+        self._subscribers = []
+
+    def latest(self, market):
+        return self._latest.get(market)
+
+    def all_latest(self):
+        return dict(self._latest)
+
+    def publish(self, market, data_ventas, data_compras, duration=0.0, complete=True, pages=None):
+        """Publica un snapshot nuevo y despierta a quien esté esperando el primero."""
+        with self._cond:
+            self._version += 1
+            snapshot = Snapshot(
+                market=market,
+                version=self._version,
+                created_at=time.time(),
+                duration=duration,
+                data_ventas=tuple(data_ventas),
+                data_compras=tuple(data_compras),
+                complete=complete,
+                pages=pages or {},
+            )
+            self._latest[market] = snapshot
+            self._cond.notify_all()
+
+        for callback in list(self._subscribers):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Error en un suscriptor de snapshots: {e}")
+        return snapshot
+
+    def restore(self, snapshot):
+        """
+        Vuelve a poner un snapshot guardado (ver SnapshotFile) si todavía no hay uno
+        más nuevo. Conserva su versión, así las siguientes siguen creciendo y las
+        ETags viejas de los navegadores no chocan con las nuevas.
+        """
+        with self._cond:
+            current = self._latest.get(snapshot.market)
+            if current is not None and current.version >= snapshot.version:
+                return None
+            self._version = max(self._version, snapshot.version)
+            self._latest[snapshot.market] = snapshot
+            self._cond.notify_all()
+
+        for callback in list(self._subscribers):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Error en un suscriptor de snapshots: {e}")
+        return snapshot
+
+    def subscribe(self, callback):
+        """Registra `callback(snapshot)`, llamado tras cada publicación. Debe ser rápido y no bloquear."""
+        self._subscribers.append(callback)
+
+    def notify_failure(self, market):
+        """Avisa a quien espera el primer snapshot de `market` de que el scrapeo en vuelo falló."""
+        with self._cond:
+            self._failures[market] = self._failures.get(market, 0) + 1
+            self._cond.notify_all()
+
+    def wait_for_first(self, market, timeout=None):
+        """
+        Bloquea hasta que exista algún snapshot de `market`, falle el scrapeo en
+        vuelo o se agote `timeout`. Devuelve el último snapshot o None.
+        """
+        with self._cond:
+            failures = self._failures.get(market, 0)
+            self._cond.wait_for(
+                lambda: market in self._latest or self._failures.get(market, 0) != failures,
+                timeout=timeout,
+            )
+            return self._latest.get(market)
+
+
+class SnapshotFile:
+    """
+    El último snapshot de cada mercado en un archivo JSON. `record` se suscribe
+    al almacén; `load` devuelve los guardados que todavía sirven para arrancar.
+
+    `publish` corre en el event loop del planificador (el mismo de Playwright):
+    `record` solo deja el snapshot y un hilo propio reescribe el archivo. Si
+    llegan varios antes de escribir, solo se guarda el último de cada mercado.
+    """
+
+    def __init__(self, path=SNAPSHOT_FILE, max_age=SNAPSHOT_RESTORE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()         # protege `_pending`
+        self._write_lock = threading.Lock()   # una escritura a la vez (hilo escritor o `flush`)
+        self._pending = {}                    # mercado -> último snapshot sin escribir
+        self._dirty = threading.Event()
+        self._entries = {}
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"No se pudo leer el último snapshot ({self.path}): {e}")
+            return []
+        snapshots = []
+        for entry in entries.values() if isinstance(entries, dict) else ():
+            try:
+                # JSON guarda los números de página como texto
+                pages = {side: {int(n): status for n, status in side_pages.items()}
+                         for side, side_pages in entry.get("pages", {}).items()}
+                snapshot = Snapshot(**{**entry, "data_ventas": tuple(entry["data_ventas"]),
+                                       "data_compras": tuple(entry["data_compras"]), "pages": pages})
+            except (TypeError, KeyError):
+                continue
+            if snapshot.age <= self.max_age:
+                self._entries[snapshot.market] = entry
+                snapshots.append(snapshot)
+        return snapshots
+
+    def start(self):
+        """Arranca el hilo escritor (idempotente)."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._write_forever, name="p2p-snapshot-file", daemon=True)
+            self._thread.start()
+
+    def record(self, snapshot):
+        """Suscriptor del almacén: deja el snapshot para el hilo escritor. Nunca bloquea."""
+        if not self.path:
+            return
+        self.start()
+        with self._lock:
+            self._pending[snapshot.market] = snapshot
+        self._dirty.set()
+
+    def _write_forever(self):
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error al guardar el último snapshot: {e}")
+
+    def flush(self):
+        """Reescribe el archivo con lo pendiente (escritura atómica). También sirve al cerrar el proceso."""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            for market, snapshot in pending.items():
+                self._entries[market] = asdict(snapshot)
+            directory = os.path.dirname(self.path)
+            tmp = f"{self.path}.tmp"
+            try:
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._entries, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"No se pudo guardar el último snapshot ({self.path}): {e}")
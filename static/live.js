@@ -0,0 +1,192 @@
+// Actualización en vivo de las tablas por Server-Sent Events.
+// El servidor manda el libro completo al conectar ("snapshot") y después solo los
+// niveles de precio que cambiaron ("diff"); acá se parchean las filas en su lugar.
+(function () {
+    "use strict";
+
+    var root = document.getElementById("p2p-live");
+    if (!root || !window.EventSource) return;
+
+    var streamUrl = root.dataset.stream;
+    // Sin lugar para otra conexión en vivo (503): se consulta el libro cada POLL_MS
+    var pollUrl = streamUrl.replace(/^\/stream/, "/api/levels");
+    var POLL_MS = 10000;
+    var RECONNECT_MS = 120000;
+    var polling = null;
+    var version = Number(root.dataset.version) || null;
+
+    // asks = gente que vende USDT (tabla de ventas, precio bajo primero)
+    // bids = gente que compra USDT (tabla de compras, precio alto primero)
+    var SIDES = {
+        asks: { table: "tabla-ventas", volume: "volumen-ventas", color: "green", descending: false },
+        bids: { table: "tabla-compras", volume: "volumen-compras", color: "red", descending: true }
+    };
+    var BAR_SCALE = 30;
+
+    function fmt(value, decimals) {
+        return value.toLocaleString("en-US", { minimumFractionDigits: decimals, maximumFractionDigits: decimals });
+    }
+
+    function rows(side) {
+        var table = document.getElementById(SIDES[side].table);
+        return table ? Array.prototype.slice.call(table.querySelectorAll("tr[data-price]")) : [];
+    }
+
+    function fillRow(row, side, level) {
+        row.dataset.price = level[0];
+        row.dataset.volume = level[1];
+        row.innerHTML =
+            "<td style='color: " + SIDES[side].color + ";'>" + fmt(level[0], 2) + "</td>" +
+            "<td>" + level[2] + "</td>" +
+            "<td>" + fmt(level[1], 0) + "</td>" +
+            "<td><span style='color: " + SIDES[side].color + ";'></span></td>";
+    }
+
+    function insertRow(side, level) {
+        var table = document.getElementById(SIDES[side].table);
+        if (!table) return;
+        var row = document.createElement("tr");
+        fillRow(row, side, level);
+        var descending = SIDES[side].descending;
+        var before = rows(side).find(function (r) {
+            var price = Number(r.dataset.price);
+            return descending ? price < level[0] : price > level[0];
+        });
+        var body = table.tBodies[0] || table;
+        body.insertBefore(row, before || null);
+    }
+
+    function findRow(side, price) {
+        return rows(side).find(function (r) { return Number(r.dataset.price) === price; });
+    }
+
+    // Las barras y el volumen total dependen de todo el lado: se recalculan tras cada cambio
+    function refreshTotals(side) {
+        var all = rows(side);
+        var total = all.reduce(function (sum, r) { return sum + Number(r.dataset.volume); }, 0);
+        all.forEach(function (r) {
+            var bar = r.querySelector("td:last-child span");
+            var size = total > 0 ? Math.floor((Number(r.dataset.volume) / total) * BAR_SCALE) : 0;
+            if (bar) bar.textContent = "⬛".repeat(size);
+        });
+        var volume = document.getElementById(SIDES[side].volume);
+        if (volume) volume.textContent = fmt(total, 0) + " USDT";
+    }
+
+    function applyChanges(side, changes) {
+        changes.remove.forEach(function (price) {
+            var row = findRow(side, price);
+            if (row) row.remove();
+        });
+        changes.add.concat(changes.change).forEach(function (level) {
+            var row = findRow(side, level[0]);
+            if (row) fillRow(row, side, level);
+            else insertRow(side, level);
+        });
+        refreshTotals(side);
+    }
+
+    function replaceAll(side, levels) {
+        rows(side).forEach(function (r) { r.remove(); });
+        levels.forEach(function (level) { insertRow(side, level); });
+        refreshTotals(side);
+    }
+
+    // La página se cachea por versión: la antigüedad del snapshot se calcula acá
+    function formatAge(seconds) {
+        seconds = Math.max(0, Math.round(seconds));
+        return seconds < 60 ? seconds + " s" : Math.floor(seconds / 60) + " min " + (seconds % 60) + " s";
+    }
+
+    function tickInfo() {
+        var info = document.getElementById("snapshot-info");
+        if (!info || !info.dataset.createdAt) return;
+        info.textContent = "Actualizado hace " + formatAge(Date.now() / 1000 - Number(info.dataset.createdAt)) +
+            " " + info.dataset.detail;
+    }
+
+    function updateInfo(data) {
+        var info = document.getElementById("snapshot-info");
+        if (info) {
+            info.dataset.createdAt = data.created_at;
+            info.dataset.detail = "(versión " + data.version + ", en vivo)";
+            tickInfo();
+        }
+        // Llegó un snapshot más nuevo que el de la página: ya no son los datos restaurados del reinicio
+        var restored = document.getElementById("snapshot-restored");
+        if (restored && data.version > Number(root.dataset.version)) restored.remove();
+    }
+
+    // Spread, precio medio y VWAP (calculados en el servidor, ver analytics.book_stats)
+    function updateStats(stats) {
+        if (!stats) return;
+        document.querySelectorAll("#book-stats [data-stat]").forEach(function (el) {
+            var value = stats[el.dataset.stat];
+            el.textContent = value === null || value === undefined ? "-" : value.toFixed(4);
+        });
+    }
+
+    var source;
+
+    function applySnapshot(data) {
+        Object.keys(SIDES).forEach(function (side) { replaceAll(side, data.levels[side]); });
+        version = data.version;
+        updateInfo(data);
+        updateStats(data.stats);
+    }
+
+    function poll() {
+        // El servidor responde con ETag: el navegador revalida y un libro sin cambios es un 304
+        fetch(pollUrl).then(function (r) { return r.ok ? r.json() : null; }).then(function (data) {
+            if (data && data.version !== version) applySnapshot(data);
+        }).catch(function () {});
+    }
+
+    function startPolling() {
+        if (!polling) {
+            poll();
+            polling = setInterval(poll, POLL_MS);
+        }
+        // Cada tanto se vuelve a probar la conexión en vivo (si vuelve a fallar, se reprograma)
+        setTimeout(function () { connect(version); }, RECONNECT_MS);
+    }
+
+    function stopPolling() {
+        if (polling) clearInterval(polling);
+        polling = null;
+    }
+
+    function connect(since) {
+        source = new EventSource(streamUrl + (since ? "?since=" + since : ""));
+
+        source.addEventListener("open", stopPolling);
+        source.addEventListener("error", function () {
+            // Una respuesta que no es text/event-stream (503 por el tope) cierra la conexión para siempre
+            if (source.readyState === EventSource.CLOSED) startPolling();
+        });
+
+        source.addEventListener("snapshot", function (e) {
+            applySnapshot(JSON.parse(e.data));
+        });
+
+        source.addEventListener("diff", function (e) {
+            var data = JSON.parse(e.data);
+            if (version !== null && data.version <= version) return;   // ya aplicado
+            if (version !== null && data.base !== version) {
+                // Nos perdimos un cambio: se pide el libro completo de nuevo
+                source.close();
+                version = null;
+                connect(null);
+                return;
+            }
+            Object.keys(SIDES).forEach(function (side) { applyChanges(side, data.changes[side]); });
+            version = data.version;
+            updateInfo(data);
+            updateStats(data.stats);
+        });
+    }
+
+    tickInfo();
+    setInterval(tickInfo, 1000);
+    connect(version);
+})();
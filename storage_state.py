@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+from metrics import REGISTRY
+
+# ----------------- ESTADO DE SESIÓN DEL NAVEGADOR -----------------
+# Tras cerrar el modal y aceptar las cookies una vez, se guarda el storage state
+# del contexto (cookies + localStorage) y los contextos siguientes arrancan con
+# él: el sitio ya no vuelve a mostrar los avisos y el scrapeo va directo a la lista.
+#
+# Un estado se descarta (y se vuelve a guardar en el próximo cierre de avisos) si:
+#   - tiene más de BROWSER_STATE_MAX_AGE segundos,
+#   - ya vencieron todas sus cookies y no tiene localStorage, o
+#   - los avisos reaparecen en un contexto que arrancó con él (el sitio lo dio por vencido).
+# BROWSER_STATE_FILE vacío lo deja solo en memoria.
+BROWSER_STATE_FILE = os.environ.get('BROWSER_STATE_FILE', 'data/browser_state.json')
+BROWSER_STATE_MAX_AGE = float(os.environ.get('BROWSER_STATE_MAX_AGE', 12 * 3600))
+
+STORAGE_STATE_EVENTS = REGISTRY.counter(
+    "p2p_storage_state_total", "Uso del storage state guardado (reused, saved, expired, stale)", ("event",))
+
+
+def _live_cookies(state, now):
+    # expires = -1 es una cookie de sesión: vale mientras dure el contexto que la cargue
+    return [c for c in state.get("cookies", []) if c.get("expires", -1) < 0 or c["expires"] > now]
+
+
+class StorageStateStore:
+    """
+    Storage state por sitio (dominio registrable, p. ej. "bitget.com"), en memoria
+    y en un archivo JSON. Se puede usar desde el event loop del scrapeo; la
+    escritura a disco es síncrona pero chica.
+    """
+
+    def __init__(self, path=BROWSER_STATE_FILE, max_age=BROWSER_STATE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError) as e:
+            print(f"No se pudo leer el estado del navegador ({self.path}): {e}")
+            return {}
+
+    def _write(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self.path)  # atómico: nunca queda un archivo a medio escribir
+        except OSError as e:
+            print(f"No se pudo guardar el estado del navegador ({self.path}): {e}")
+
+    def is_expired(self, entry, now=None):
+        now = now if now is not None else time.time()
+        if now - entry.get("saved_at", 0) > self.max_age:
+            return True
+        state = entry.get("state", {})
+        has_storage = any(origin.get("localStorage") for origin in state.get("origins", []))
+        return not _live_cookies(state, now) and not has_storage
+
+    def get(self, site):
+        """Storage state vigente de `site` (para `new_context(storage_state=...)`), o None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(site)
+            if entry is None:
+                return None
+            if self.is_expired(entry, now):
+                del self._entries[site]
+                self._write()
+                STORAGE_STATE_EVENTS.inc(event="expired")
+                return None
+        STORAGE_STATE_EVENTS.inc(event="reused")
+        state = entry["state"]
+        return {**state, "cookies": _live_cookies(state, now)}
+
+    async def save(self, site, context):
+        """Guarda el storage state actual de `context` como el de `site`."""
+        state = await context.storage_state()
+        with self._lock:
+            self._entries[site] = {"saved_at": time.time(), "state": state}
+            self._write()
+        STORAGE_STATE_EVENTS.inc(event="saved")
+
+    def mark_stale(self, site):
+        """Los avisos volvieron a aparecer pese al estado guardado: se reemplazará en el próximo `save`."""
+        STORAGE_STATE_EVENTS.inc(event="stale")
+        with self._lock:
+            if self._entries.pop(site, None) is not None:
+                self._write()
@@ -0,0 +1,176 @@
+import json
+import os
+import queue
+import threading
+import time
+from analytics import book_stats, summarize
+
+# ----------------- ACTUALIZACIONES POR SERVER-SENT EVENTS -----------------
+# Cuando se publica un snapshot se calcula UNA vez la diferencia por nivel de
+# precio con el anterior del mismo mercado, se serializa UNA vez como evento SSE
+# y esos mismos bytes se encolan a cada navegador conectado. El costo del
+# servidor crece con los cambios del libro, no con visitantes × refrescos.
+
+HEARTBEAT_INTERVAL = 15      # segundos entre comentarios "ping" (mantienen viva la conexión)
+# Cada conexión se cierra tras este tiempo; EventSource reconecta solo con Last-Event-ID
+STREAM_MAX_SECONDS = int(os.environ.get('STREAM_MAX_SECONDS', 300))
+SUBSCRIBER_QUEUE_SIZE = 32
+RETRY_MS = 3000
+# Cada conexión abierta ocupa un hilo de gunicorn (gthread) todo el tiempo: como mucho
+# la mitad de WEB_THREADS, así páginas, API y /healthz siempre tienen hilos libres.
+# Por encima del tope /stream responde 503 y live.js pasa a consultar /api/levels.
+SSE_MAX_CONNECTIONS = int(os.environ.get('SSE_MAX_CONNECTIONS', int(os.environ.get('WEB_THREADS', 256)) // 2))
+
+
+def _level_map(levels):
+    return {precio: (volumen, anuncios) for precio, volumen, anuncios in levels}
+
+
+def diff_levels(old_levels, new_levels):
+    """
+    Cambios entre dos listas de niveles `[precio, volumen, anuncios]`:
+    {"add": [[precio, volumen, anuncios]], "change": [...], "remove": [precio]}.
+    """
+    old, new = _level_map(old_levels), _level_map(new_levels)
+    return {
+        "add": [[p, *new[p]] for p in new if p not in old],
+        "change": [[p, *new[p]] for p in new if p in old and old[p] != new[p]],
+        "remove": [p for p in old if p not in new],
+    }
+
+
+def format_event(event, data, event_id=None):
+    """Texto de un evento SSE (ya codificado)."""
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+def levels_payload(snapshot, levels, stats):
+    """Libro completo por nivel de precio (el evento "snapshot" y /api/levels)."""
+    return {
+        "version": snapshot.version,
+        "created_at": snapshot.created_at,
+        "stats": stats,
+        "levels": levels,
+    }
+
+
+class Broadcaster:
+    """
+    Reparte eventos de cambios por mercado a los suscriptores conectados.
+    Se registra como suscriptor de SnapshotStore (`on_snapshot`).
+    """
+
+    def __init__(self, max_connections=SSE_MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.connections_rejected = 0
+        self._connections = 0      # conexiones reservadas (ver `reserve`)
+        self._lock = threading.Lock()
+        self._subscribers = {}     # mercado -> set de colas
+        self._levels = {}          # mercado -> niveles del último snapshot
+        self._versions = {}        # mercado -> versión del último snapshot
+        self._full_events = {}     # mercado -> (versión, evento "snapshot" completo)
+        self.events_sent = 0
+        self.subscribers_dropped = 0
+
+    def _snapshot_event(self, snapshot, levels, stats):
+        return format_event("snapshot", levels_payload(snapshot, levels, stats), event_id=snapshot.version)
+
+    def on_snapshot(self, snapshot):
+        summary = summarize(snapshot)
+        levels = summary["levels"]
+        stats = book_stats(summary)
+        previous = self._levels.get(snapshot.market)
+        base = self._versions.get(snapshot.market)
+        self._levels[snapshot.market] = levels
+        self._versions[snapshot.market] = snapshot.version
+        full_event = self._snapshot_event(snapshot, levels, stats)
+        self._full_events[snapshot.market] = (snapshot.version, full_event)
+
+        if previous is None:
+            event = full_event
+        else:
+            changes = {side: diff_levels(previous[side], levels[side]) for side in ("asks", "bids")}
+            # Los valores son absolutos: aplicar dos veces el mismo diff no cambia el resultado
+            event = format_event("diff", {
+                "version": snapshot.version,
+                "base": base,
+                "created_at": snapshot.created_at,
+                "stats": stats,
+                "changes": changes,
+            }, event_id=snapshot.version)
+
+        with self._lock:
+            subscribers = list(self._subscribers.get(snapshot.market, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+                self.events_sent += 1
+            except queue.Full:
+                # Cliente demasiado lento: se le corta y al reconectar recibe el libro completo
+                self._remove(snapshot.market, subscriber)
+                self.subscribers_dropped += 1
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(None)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def viewers(self, market=None):
+        """Cantidad de conexiones abiertas (de un mercado o de todos)."""
+        with self._lock:
+            if market is not None:
+                return len(self._subscribers.get(market, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+    def reserve(self):
+        """
+        Reserva un lugar para una conexión nueva. Devuelve False si ya hay
+        `max_connections` abiertas; si devuelve True hay que llamar a `release` al cerrar.
+        """
+        with self._lock:
+            if self._connections >= self.max_connections:
+                self.connections_rejected += 1
+                return False
+            self._connections += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._connections = max(0, self._connections - 1)
+
+    def _add(self, market):
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(market, set()).add(subscriber)
+        return subscriber
+
+    def _remove(self, market, subscriber):
+        with self._lock:
+            self._subscribers.get(market, set()).discard(subscriber)
+
+    def stream(self, market, last_event_id=None):
+        """
+        Generador de bytes SSE para una conexión. Si el cliente no tiene la última
+        versión (por `last_event_id`), empieza con el libro completo.
+        """
+        subscriber = self._add(market)
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            version, full_event = self._full_events.get(market, (None, None))
+            if full_event is not None and str(version) != str(last_event_id):
+                yield full_event
+
+            closes_at = time.monotonic() + STREAM_MAX_SECONDS
+            while time.monotonic() < closes_at:
+                try:
+                    event = subscriber.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield b": ping\n\n"
+                    continue
+                if event is None:
+                    break
+                yield event
+        finally:
+            self._remove(market, subscriber)